@@ -0,0 +1,10 @@
+-- Partial indexes matching the /messages and /consumptions queries
+-- (WHERE message_id IS NOT NULL ORDER BY timestamp DESC): rows are read in index order,
+-- so no sort step is needed and rows without message_id are never visited
+CREATE INDEX IF NOT EXISTS idx_messages_recent
+    ON messages (timestamp DESC) WHERE message_id IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_consumptions_recent
+    ON consumptions (timestamp DESC) WHERE message_id IS NOT NULL;
+
+-- Subscriptions lookups by sid are already served by the (sid, topic) primary key
@@ -1,17 +1,21 @@
 # client.py
 
 import logging
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List
 
 import requests
 import socketio
+from requests.adapters import HTTPAdapter
 from socketio import exceptions
 
+from pubsub.pubsub_json import OrjsonModule, dumps_bytes
+
 # Configure logging for debugging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 BASE_URL = "http://localhost:5000"
+_JSON_HEADERS = {"Content-Type": "application/json"}
 
 
 # noinspection PyMethodMayBeStatic
@@ -28,44 +32,66 @@ class PubSubClient:
         self.consumer_name = consumer_name
         self.topics = topics
 
+        # Keep-alive HTTP session reused by every publish
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+
         # Register event handlers
         self.sio.on("message", self.on_message)
         self.sio.on("new_client", self.on_new_client)
         self.sio.on("client_disconnected", self.on_client_disconnected)
         self.sio.on("new_consumption", self.on_new_consumption)
         self.sio.on("new_message", self.on_new_message)
+        # The server groups these events into lists sent as "<event>_batch"
+        for event, handler in (("message", self.on_message),
+                               ("new_client", self.on_new_client),
+                               ("client_disconnected", self.on_client_disconnected),
+                               ("new_consumption", self.on_new_consumption),
+                               ("new_message", self.on_new_message)):
+            self.sio.on(f"{event}_batch", self._for_each(handler))
+
+    @staticmethod
+    def _for_each(handler: Callable[[Dict[str, Any]], None]) -> Callable[[List[Any]], None]:
+        """Wrap a single-event handler so it is called for every event of a batch."""
+        def handle_batch(events: List[Dict[str, Any]]) -> None:
+            for data in events:
+                handler(data)
+
+        return handle_batch
 
     def connect(self) -> None:
-        logger.info(f"Attempting to connect as {self.consumer_name} to {BASE_URL}")
+        logger.info("Attempting to connect as %s to %s", self.consumer_name, BASE_URL)
         try:
             self.sio.connect(BASE_URL)
             self.sio.emit("subscribe", {"consumer": self.consumer_name, "topics": self.topics})
-            logger.info(f"Connected as {self.consumer_name}, subscribed to {self.topics}")
+            logger.info("Connected as %s, subscribed to %s", self.consumer_name, self.topics)
         except exceptions.ConnectionError as e:
-            logger.error(f"Failed to connect to server: {e}")
+            logger.error("Failed to connect to server: %s", e)
             # Optionally, implement retry logic or exit
         except Exception as e:
-            logger.error(f"An unexpected error occurred during connection: {e}")
+            logger.error("An unexpected error occurred during connection: %s", e)
 
     def on_message(self, data: Dict[str, Any]) -> None:
         """Handle incoming messages."""
-        logger.info(f"[MESSAGE] [{data['topic']}] {data['message']}")
+        logger.info("[MESSAGE] [%s] %s", data["topic"], data["message"])
 
     def on_new_client(self, data: Dict[str, Any]) -> None:
         """Handle new client connections."""
-        logger.info(f"[NEW CLIENT] {data}")
+        logger.info("[NEW CLIENT] %s", data)
 
     def on_client_disconnected(self, data: Dict[str, Any]) -> None:
         """Handle client disconnections."""
-        logger.info(f"[CLIENT DISCONNECTED] {data}")
+        logger.info("[CLIENT DISCONNECTED] %s", data)
 
     def on_new_consumption(self, data: Dict[str, Any]) -> None:
         """Handle new consumption events."""
-        logger.info(f"[NEW CONSUMPTION] {data}")
+        logger.info("[NEW CONSUMPTION] %s", data)
 
     def on_new_message(self, data: Dict[str, Any]) -> None:
         """Handle new message events."""
-        logger.info(f"[NEW MESSAGE] {data}")
+        logger.info("[NEW MESSAGE] %s", data)
 
     def publish(self, topic: str, message: Any, message_id: str) -> Dict[str, Any]:
         """
@@ -76,25 +102,28 @@ class PubSubClient:
         :param message_id: Unique message ID
         :return: Server response
         """
-        logger.info(f"Publishing to topic {topic}: {message} with ID {message_id}")
-        resp = requests.post(
+        logger.info("Publishing to topic %s: %s with ID %s", topic, message, message_id)
+        resp = self.http.post(
             f"{BASE_URL}/publish",
-            json={"topic": topic, "message": message, "producer": self.consumer_name,
-                  "message_id": message_id},
+            data=dumps_bytes({"topic": topic, "message": message, "producer": self.consumer_name,
+                              "message_id": message_id}),
+            headers=_JSON_HEADERS,
             timeout=10,
         )
-        logger.info(f"Publish response: {resp.json()}")
-        return resp.json()  # type: ignore[no-any-return]
+        result = OrjsonModule.loads(resp.content)
+        logger.info("Publish response: %s", result)
+        return result  # type: ignore[no-any-return]
 
     def run_forever(self) -> None:
         """Keep the client running indefinitely."""
         self.sio.wait()
 
     def disconnect(self) -> None:
-        """Disconnect from the Socket.IO server."""
+        """Disconnect from the Socket.IO server and release pooled HTTP connections."""
+        self.http.close()
         if self.sio.connected:
             self.sio.disconnect()
-            logger.info(f"Disconnected {self.consumer_name} from server.")
+            logger.info("Disconnected %s from server.", self.consumer_name)
 
 
 def main() -> None:
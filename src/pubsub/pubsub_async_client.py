@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+import socketio
+
+from .pubsub_json import OrjsonModule, dumps_bytes
+from .pubsub_message import MESSAGE_ID_KEY, MESSAGE_KEY, TOPIC_KEY, PubSubMessage
+
+# Configure logging for debugging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+Handler = Callable[[Any], Union[None, Awaitable[None]]]
+
+
+class AsyncPubSubClient:
+
+    def __init__(self, url: str, consumer: str, topics: List[str], max_workers: int = 8):
+        """
+        Initialize the asyncio PubSub client.
+
+        Requires the ``async`` extra (``aiohttp``). Coroutine handlers are awaited on the event
+        loop, plain functions run in a bounded thread pool so they cannot block it.
+
+        :param url: URL of the Socket.IO server, e.g., http://localhost:5000
+        :param consumer: Consumer name (e.g., 'alice')
+        :param topics: List of topics to subscribe to
+        :param max_workers: Number of threads used to run synchronous handlers
+        """
+        self.url = url.rstrip("/")
+        self.consumer = consumer
+        self.topics = topics
+        self.handlers: Dict[str, Handler] = {}  # topic → function or coroutine function
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._publish_url = f"{self.url}/publish"
+        self._http: Optional[Any] = None  # aiohttp.ClientSession, created lazily on the loop
+
+        # Create Socket.IO client with explicit reconnection settings
+        self.sio = socketio.AsyncClient(
+            reconnection=True,
+            reconnection_attempts=0,  # Infinite reconnection attempts
+            reconnection_delay=2000,  # Delay between reconnection attempts (ms)
+            reconnection_delay_max=10000,  # Max delay for reconnection
+            json=OrjsonModule,
+        )
+
+        # Register generic events
+        self.sio.on("connect", self.on_connect)
+        self.sio.on("message", self.on_message)
+        self.sio.on("message_batch", self.on_message_batch)
+        self.sio.on("disconnect", self.on_disconnect)
+
+    def register_handler(self, topic: str, handler_func: Handler) -> None:
+        """
+        Register a custom handler for a given topic.
+
+        :param topic: Topic to handle
+        :param handler_func: Function or coroutine function called with the message
+        """
+        self.handlers[sys.intern(topic)] = handler_func
+
+    async def on_connect(self) -> None:
+        """Handle connection to the server."""
+        logger.info("[%s] Connected to server %s", self.consumer, self.url)
+        await self.sio.emit("subscribe", {"consumer": self.consumer, "topics": self.topics})
+
+    async def on_message(self, data: Dict[str, Any]) -> None:
+        """
+        Dispatch an incoming message to its topic handler and acknowledge consumption.
+
+        :param data: Message data containing topic, message_id, message, and producer
+        """
+        topic = data[TOPIC_KEY]
+        message_id = data.get(MESSAGE_ID_KEY)
+        message = data[MESSAGE_KEY]
+
+        handler = self.handlers.get(topic)
+        if handler is not None:
+            try:
+                if asyncio.iscoroutinefunction(handler):
+                    await handler(message)
+                else:
+                    loop = asyncio.get_running_loop()
+                    await loop.run_in_executor(self._executor, handler, message)
+            except Exception as e:
+                logger.error("[%s] Error in handler for topic %s: %s", self.consumer, topic, e)
+        else:
+            logger.warning("[%s] No handler for topic %s.", self.consumer, topic)
+
+        await self.sio.emit(
+            "consumed",
+            {"consumer": self.consumer, "topic": topic, "message_id": message_id,
+             "message": message},
+        )
+
+    async def on_message_batch(self, messages: List[Dict[str, Any]]) -> None:
+        """Handle messages sent together by the server, such as subscription confirmations."""
+        for data in messages:
+            await self.on_message(data)
+
+    async def on_disconnect(self) -> None:
+        """Handle disconnection from the server."""
+        logger.info(
+            "[%s] Disconnected from server. Reconnection will be attempted automatically.",
+            self.consumer,
+        )
+
+    async def publish(self, topic: str, message: Any, producer: str, message_id: str) -> None:
+        """
+        Publish a message via HTTP POST using a persistent aiohttp session.
+
+        :param topic: Topic to publish to
+        :param message: Message content
+        :param producer: Name of the producer
+        :param message_id: Unique message ID
+        """
+        import aiohttp
+
+        if self._http is None:
+            self._http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+
+        payload = PubSubMessage.new_dict(topic, message, producer, message_id)
+        logger.info("[%s] Publishing to %s: %s", self.consumer, topic, payload)
+        try:
+            async with self._http.post(self._publish_url, data=dumps_bytes(payload),
+                                       headers=_JSON_HEADERS) as resp:
+                resp.raise_for_status()
+                if logger.isEnabledFor(logging.INFO):  # Skip decoding the body when not logged
+                    logger.info("[%s] Publish response: %s", self.consumer, await resp.json())
+        except aiohttp.ClientResponseError as e:
+            logger.error(
+                "[%s] HTTP error during publish: %s - %s", self.consumer, e.status, e.message
+            )
+        except aiohttp.ClientError as e:
+            logger.error("[%s] Connection error during publish: %s", self.consumer, e)
+        except Exception as e:
+            logger.error("[%s] An unexpected error occurred during publish: %s", self.consumer, e)
+
+    async def close(self) -> None:
+        """Disconnect and release the HTTP session and handler threads."""
+        if self.sio.connected:
+            await self.sio.disconnect()
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+        self._executor.shutdown(wait=False)
+
+    async def _run(self) -> None:
+        await self.sio.connect(self.url)
+        try:
+            await self.sio.wait()
+        finally:
+            await self.close()
+
+    def start(self) -> None:
+        """Start the client and block on its own event loop."""
+        logger.info("Starting async client %s with topics %s", self.consumer, self.topics)
+        asyncio.run(self._run())
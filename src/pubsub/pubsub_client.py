@@ -1,27 +1,63 @@
 import logging
 import queue
+import socket
+import sys
 import threading
-from typing import Any, Callable, Dict, List
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
 
 import requests
 import socketio
+from requests.adapters import HTTPAdapter
 
-from .pubsub_message import PubSubMessage
+from .pubsub_json import OrjsonModule, dumps_bytes
+from .pubsub_message import (
+    MESSAGE_ID_KEY,
+    MESSAGE_KEY,
+    PRODUCER_KEY,
+    TOPIC_KEY,
+    PubSubMessage,
+    new_message_id,
+)
 
 # Configure logging for debugging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Socket options for the Socket.IO websocket, applied before connecting so the larger buffers
+# are taken into account for TCP window scaling
+_SOCKET_BUFFER_SIZE = 4 << 20
+_WEBSOCKET_SOCKOPT = [
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_SNDBUF, _SOCKET_BUFFER_SIZE),
+    (socket.SOL_SOCKET, socket.SO_RCVBUF, _SOCKET_BUFFER_SIZE),
+]
+
+# Number of payload dicts a client keeps for reuse across publishes
+_DICT_POOL_SIZE = 64
+
 
 class PubSubClient:
 
-    def __init__(self, url: str, consumer: str, topics: List[str]):
+    def __init__(self, url: str, consumer: str, topics: List[str], batch_size: int = 0,
+                 write_delay_ms: int = 20, handler_workers: int = 0,
+                 max_pending_handlers: int = 256):
         """
         Initialize the PubSub client.
 
         :param url: URL of the Socket.IO server, e.g., http://localhost:5000
         :param consumer: Consumer name (e.g., 'alice')
         :param topics: List of topics to subscribe to
+        :param batch_size: Maximum number of messages sent per batch (0 disables batching)
+        :param write_delay_ms: Maximum time (ms) a batched message waits before being flushed
+        :param handler_workers: Number of threads running handlers concurrently (0 processes
+            messages one by one, in order)
+        :param max_pending_handlers: Maximum number of messages submitted to the handler
+            threads but not yet handled; the queue stops draining while the limit is reached
         """
         self.url = url.rstrip("/")
         self.consumer = consumer
@@ -31,19 +67,50 @@ class PubSubClient:
             Any] = queue.Queue()  # Queue for processing messages sequentially
         self.running = False
 
+        # Optional concurrent handler execution, bounded to apply back-pressure
+        self._handler_pool: Optional[ThreadPoolExecutor] = (
+            ThreadPoolExecutor(max_workers=handler_workers) if handler_workers > 0 else None
+        )
+        self._handler_slots = threading.BoundedSemaphore(max_pending_handlers)
+
+        # Keep-alive HTTP session reused by every publish (avoids a TCP handshake per message)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        # Endpoint URLs built once rather than formatted on every publish
+        self._publish_url = f"{self.url}/publish"
+        self._publish_batch_url = f"{self.url}/publish_batch"
+
+        # Payload dicts recycled once serialized; empty pool falls back to a fresh dict
+        self._dict_pool: List[Dict[str, Any]] = [{} for _ in range(_DICT_POOL_SIZE)]
+
+        # Optional publish batching, flushed by a background thread
+        self.batch_size = batch_size
+        self.write_delay = write_delay_ms / 1000.0
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._flush_cond = threading.Condition()
+        self._flush_thread: Optional[threading.Thread] = None
+        self._closing = False
+
         # Create Socket.IO client with explicit reconnection settings
         self.sio = socketio.Client(
             reconnection=True,
             reconnection_attempts=0,  # Infinite reconnection attempts
             reconnection_delay=2000,  # Delay between reconnection attempts (ms)
             reconnection_delay_max=10000,  # Max delay for reconnection
+            json=OrjsonModule,  # Faster encoding/decoding of Socket.IO packets
+            websocket_extra_options={"sockopt": _WEBSOCKET_SOCKOPT},  # No Nagle, 4 MB buffers
         )
 
         # Register generic events
         self.sio.on("connect", self.on_connect)
         self.sio.on("message", self.on_message)
+        self.sio.on("message_batch", self.on_message_batch)
         self.sio.on("disconnect", self.on_disconnect)
         self.sio.on("new_message", self.on_new_message)
+        self.sio.on("new_message_batch", self.on_new_message_batch)
 
     def register_handler(self, topic: str, handler_func: Callable[[Any], None]) -> None:
         """
@@ -52,11 +119,27 @@ class PubSubClient:
         :param topic: Topic to handle
         :param handler_func: Function to call when a message is received
         """
-        self.handlers[topic] = handler_func
+        self.handlers[sys.intern(topic)] = handler_func
+
+    def _dispatch(self, topic: str, message: Any) -> None:
+        """
+        Call the handler registered for a topic with a message, containing any failure.
+
+        ``self.handlers`` is looked up on every message, a single dict lookup, so handlers
+        written directly to the public dict are honoured as well as registered ones.
+        """
+        handler = self.handlers.get(topic)
+        if handler is None:
+            logger.warning("[%s] No handler for topic %s.", self.consumer, topic)
+            return
+        try:
+            handler(message)
+        except Exception as e:
+            logger.error("[%s] Error in handler for topic %s: %s", self.consumer, topic, e)
 
     def on_connect(self) -> None:
         """Handle connection to the server."""
-        logger.info(f"[{self.consumer}] Connected to server {self.url}")
+        logger.info("[%s] Connected to server %s", self.consumer, self.url)
         self.sio.emit("subscribe", {"consumer": self.consumer, "topics": self.topics})
         if not self.running:
             self.running = True
@@ -68,85 +151,253 @@ class PubSubClient:
 
         :param data: Message data containing topic, message_id, message, and producer
         """
-        logger.info(f"[{self.consumer}] Queuing message: {data}")
+        logger.info("[%s] Queuing message: %s", self.consumer, data)
         self.message_queue.put(data)
 
+    def on_message_batch(self, messages: List[Dict[str, Any]]) -> None:
+        """Handle messages sent together by the server, such as subscription confirmations."""
+        for data in messages:
+            self.on_message(data)
+
     def process_queue(self) -> None:
-        """Process messages from the queue one by one."""
+        """Process messages from the queue, one by one or through the handler threads."""
         while self.running:
             try:
                 data = self.message_queue.get(timeout=1.0)
-                topic = data["topic"]
-                message_id = data.get("message_id")
-                message = data["message"]
-                producer = data.get("producer")
-
-                logger.info(
-                    f"[{self.consumer}] Processing message from topic [{topic}]: "
-                    f"{message} (from {producer}, ID={message_id})"
-                )
-
-                if topic in self.handlers:
-                    try:
-                        self.handlers[topic](message)
-                    except Exception as e:
-                        logger.error(f"[{self.consumer}] Error in handler for topic {topic}: {e}")
+                if self._handler_pool is None:
+                    self._handle(data)
                 else:
-                    logger.warning(f"[{self.consumer}] No handler for topic {topic}.")
-
-                # Notify consumption
-                self.sio.emit(
-                    "consumed",
-                    {"consumer": self.consumer, "topic": topic, "message_id": message_id,
-                     "message": message},
-                )
-
+                    self._handler_slots.acquire()  # Wait while too many messages are in flight
+                    self._handler_pool.submit(self._handle_and_release, data)
                 self.message_queue.task_done()
             except queue.Empty:
                 continue
             except Exception as e:
-                logger.error(f"[{self.consumer}] Error processing message: {e}")
+                logger.error("[%s] Error processing message: %s", self.consumer, e)
+
+    def _handle(self, data: Dict[str, Any]) -> None:
+        """Run the handler for a message, then acknowledge its consumption."""
+        topic = data[TOPIC_KEY]
+        message_id = data.get(MESSAGE_ID_KEY)
+        message = data[MESSAGE_KEY]
+        producer = data.get(PRODUCER_KEY)
+
+        logger.info(
+            "[%s] Processing message from topic [%s]: %s (from %s, ID=%s)",
+            self.consumer, topic, message, producer, message_id,
+        )
+
+        self._dispatch(topic, message)
+
+        # Notify consumption
+        self.sio.emit(
+            "consumed",
+            {"consumer": self.consumer, "topic": topic, "message_id": message_id,
+             "message": message},
+        )
+
+    def _handle_and_release(self, data: Dict[str, Any]) -> None:
+        """Handle a message on a handler thread and free its in-flight slot."""
+        try:
+            self._handle(data)
+        except Exception as e:
+            logger.error("[%s] Error processing message: %s", self.consumer, e)
+        finally:
+            self._handler_slots.release()
 
     def on_disconnect(self) -> None:
         """Handle disconnection from the server."""
         logger.info(
-            f"[{self.consumer}] Disconnected from server. "
-            "Reconnection will be attempted automatically."
+            "[%s] Disconnected from server. Reconnection will be attempted automatically.",
+            self.consumer,
         )
         self.running = False  # Stop queue processing until reconnected
 
     def on_new_message(self, data: Dict[str, Any]) -> None:
         """Handle new message events."""
-        logger.info(f"[{self.consumer}] New message: {data}")
+        logger.info("[%s] New message: %s", self.consumer, data)
+
+    def on_new_message_batch(self, events: List[Dict[str, Any]]) -> None:
+        """Handle new message events coalesced by the server."""
+        for data in events:
+            self.on_new_message(data)
 
     def publish(self, topic: str, message: Any, producer: str, message_id: str) -> None:
         """
-        Publish a message via HTTP POST to the pubsub backend.
+        Publish a message to the pubsub backend.
+
+        When batching is enabled the message is queued and sent by the background flush
+        thread, otherwise it is posted immediately (see ``publish_now``).
 
         :param topic: Topic to publish to
         :param message: Message content
         :param producer: Name of the producer
         :param message_id: Unique message ID
         """
-        msg = PubSubMessage.new(topic, message, producer, message_id)
-        url = f"{self.url}/publish"
-        logger.info(f"[{self.consumer}] Publishing to {topic}: {msg.to_dict()}")
+        if self.batch_size <= 0:
+            self.publish_now(topic, message, producer, message_id)
+            return
+
+        payload = self._acquire_payload(topic, message, producer, message_id)
+        with self._flush_cond:
+            self._pending.append(payload)
+            if self._flush_thread is None:
+                self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+                self._flush_thread.start()
+            self._flush_cond.notify()
+
+    def publish_now(self, topic: str, message: Any, producer: str, message_id: str) -> None:
+        """
+        Publish a message via HTTP POST to the pubsub backend, bypassing any batching.
+
+        :param topic: Topic to publish to
+        :param message: Message content
+        :param producer: Name of the producer
+        :param message_id: Unique message ID
+        """
+        payload = self._acquire_payload(topic, message, producer, message_id)
+        try:
+            if logger.isEnabledFor(logging.INFO):
+                # Rendered now: the pooled dict is cleared once posted, a deferred log
+                # handler would otherwise show it empty or refilled
+                logger.info("[%s] Publishing to %s: %s", self.consumer, topic, str(payload))
+            self._post(self._publish_url, payload)
+        finally:
+            self._release_payloads((payload,))
+
+    def publisher(self, producer: str) -> Callable[..., None]:
+        """
+        Build a publish function specialized for a single producer.
+
+        The producer name, prepared request and pooling helpers are bound once as closure
+        variables, so each call only fills the payload and posts it. When batching is enabled
+        the function defers to ``publish``.
+
+        :param producer: Name of the producer stamped on every message
+        :return: Function taking ``(topic, message, message_id=None)``
+        """
+        if self.batch_size > 0:
+            publish = self.publish
+
+            def publish_batched(topic: str, message: Any,
+                                message_id: Optional[str] = None) -> None:
+                publish(topic, message, producer, message_id)
+
+            return publish_batched
+
+        acquire = self._acquire_payload
+        release = self._release_payloads
+        post = self._post
+        url = self._publish_url
+        consumer = self.consumer
+
+        def publish_now(topic: str, message: Any, message_id: Optional[str] = None) -> None:
+            payload = acquire(topic, message, producer, message_id)
+            try:
+                if logger.isEnabledFor(logging.INFO):  # Rendered before the dict is recycled
+                    logger.info("[%s] Publishing to %s: %s", consumer, topic, str(payload))
+                post(url, payload)
+            finally:
+                release((payload,))
+
+        return publish_now
+
+    def flush(self) -> None:
+        """Send every pending batched message synchronously."""
+        while True:
+            with self._flush_cond:
+                batch = self._take_batch()
+            if not batch:
+                return
+            self._send_batch(batch)
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        """Pop up to ``batch_size`` pending messages. Must be called with the lock held."""
+        count = min(len(self._pending), max(self.batch_size, 1))
+        return [self._pending.popleft() for _ in range(count)]
+
+    def _flush_loop(self) -> None:
+        """Background thread sending batches when full or after ``write_delay``."""
+        while True:
+            with self._flush_cond:
+                while not self._pending and not self._closing:
+                    self._flush_cond.wait()
+                deadline = time.monotonic() + self.write_delay
+                while len(self._pending) < self.batch_size and not self._closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._flush_cond.wait(remaining)
+                batch = self._take_batch()
+                if not batch and self._closing:
+                    return
+            if batch:
+                self._send_batch(batch)
+
+    def _send_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """POST a list of messages to the batch endpoint."""
+        logger.info("[%s] Publishing batch of %d messages", self.consumer, len(batch))
+        try:
+            self._post(self._publish_batch_url, batch)
+        finally:
+            self._release_payloads(batch)
+
+    def _acquire_payload(self, topic: str, message: Any, producer: str,
+                         message_id: Optional[str]) -> Dict[str, Any]:
+        """Fill a pooled dict with the wire representation of a message."""
         try:
-            resp = requests.post(url, json=msg.to_dict(), timeout=10)
+            payload = self._dict_pool.pop()
+        except IndexError:
+            return PubSubMessage.new_dict(topic, message, producer, message_id)
+        payload[TOPIC_KEY] = topic
+        payload[MESSAGE_ID_KEY] = message_id or new_message_id()
+        payload[MESSAGE_KEY] = message
+        payload[PRODUCER_KEY] = producer
+        return payload
+
+    def _release_payloads(self, payloads: Iterable[Dict[str, Any]]) -> None:
+        """Clear serialized payloads and return them to the pool, up to its size."""
+        pool = self._dict_pool
+        for payload in payloads:
+            payload.clear()
+            if len(pool) < _DICT_POOL_SIZE:
+                pool.append(payload)
+
+    def _post(self, url: str, payload: Any) -> None:
+        """POST a JSON payload through the pooled session, logging any failure."""
+        try:
+            # Session.post, not a reused PreparedRequest: it merges the environment settings
+            # (proxies, REQUESTS_CA_BUNDLE, verify) and the session's current cookies and auth
+            resp = self._session.post(url, data=dumps_bytes(payload), headers=_JSON_HEADERS,
+                                      timeout=10)
             resp.raise_for_status()  # Raises HTTPError for bad responses (4xx or 5xx)
-            logger.info(f"[{self.consumer}] Publish response: {resp.json()}")
+            if logger.isEnabledFor(logging.INFO):  # Skip decoding the body when not logged
+                logger.info("[%s] Publish response: %s", self.consumer, resp.json())
         except requests.exceptions.ConnectionError as e:
-            logger.error(f"[{self.consumer}] Connection error during publish: {e}")
+            logger.error("[%s] Connection error during publish: %s", self.consumer, e)
         except requests.exceptions.HTTPError as e:
             logger.error(
-                f"[{self.consumer}] HTTP error during publish: "
-                f"{e.response.status_code} - {e.response.text}"
+                "[%s] HTTP error during publish: %s - %s",
+                self.consumer, e.response.status_code, e.response.text,
             )
         except Exception as e:
-            logger.error(f"[{self.consumer}] An unexpected error occurred during publish: {e}")
+            logger.error("[%s] An unexpected error occurred during publish: %s", self.consumer, e)
+
+    def close(self) -> None:
+        """Flush pending batched messages, release pooled HTTP connections and handler threads."""
+        with self._flush_cond:
+            self._closing = True
+            self._flush_cond.notify()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+            self._flush_thread = None
+        self.flush()
+        self._session.close()
+        if self._handler_pool is not None:
+            self._handler_pool.shutdown(wait=True)
 
     def start(self) -> None:
         """Start the client and connect to the server."""
-        logger.info(f"Starting client {self.consumer} with topics {self.topics}")
+        logger.info("Starting client %s with topics %s", self.consumer, self.topics)
         self.sio.connect(self.url)
         self.sio.wait()
@@ -0,0 +1,34 @@
+from typing import Any, Union
+
+import orjson
+
+# Dict keys are not always strings (e.g. ints coming from user payloads)
+_DUMPS_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """
+    Serialize an object to compact JSON bytes using orjson.
+
+    :param obj: Object to serialize
+    :return: UTF-8 encoded JSON
+    """
+    return orjson.dumps(obj, option=_DUMPS_OPTIONS)
+
+
+class OrjsonModule:
+    """
+    Minimal ``json`` module replacement backed by orjson.
+
+    python-socketio and python-engineio accept a custom module exposing ``dumps`` and ``loads``
+    through their ``json`` argument; formatting keyword arguments they pass are ignored since
+    orjson always produces compact output.
+    """
+
+    @staticmethod
+    def dumps(obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, option=_DUMPS_OPTIONS).decode()
+
+    @staticmethod
+    def loads(s: Union[str, bytes], **kwargs: Any) -> Any:
+        return orjson.loads(s)
@@ -1,10 +1,33 @@
-from dataclasses import asdict, dataclass
+import os
+from dataclasses import dataclass
 from typing import Any, Dict, Optional
-from uuid import uuid4
+
+from .pubsub_json import dumps_bytes
+
+# Keys of a message payload, shared by the builders and the client receive paths
+TOPIC_KEY = "topic"
+MESSAGE_ID_KEY = "message_id"
+MESSAGE_KEY = "message"
+PRODUCER_KEY = "producer"
+
+
+def new_message_id() -> str:
+    """
+    Generate a random 128-bit message ID as 32 hex characters.
+
+    Cheaper than ``str(uuid.uuid4())`` since no ``UUID`` object is built.
+
+    :return: Hex-encoded message ID
+    """
+    return os.urandom(16).hex()
 
 
 @dataclass
 class PubSubMessage:
+    # Declared by hand since dataclass(slots=True) needs Python 3.10; valid because no field
+    # has a default value
+    __slots__ = ("topic", "message_id", "message", "producer")
+
     topic: str
     message_id: str
     message: Any
@@ -19,16 +42,44 @@ class PubSubMessage:
         :param topic: Topic of the message
         :param message: Message content
         :param producer: Producer name
-        :param message_id: Unique message ID (optional, defaults to UUID)
+        :param message_id: Unique message ID (optional, defaults to a random hex ID)
         :return: PubSubMessage instance
         """
-        return PubSubMessage(topic=topic, message_id=message_id or str(uuid4()), message=message,
+        return PubSubMessage(topic=topic, message_id=message_id or new_message_id(), message=message,
                              producer=producer)
 
+    @staticmethod
+    def new_dict(topic: str, message: Any, producer: str,
+                 message_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Build the wire representation of a message without creating an instance.
+
+        Equivalent to ``PubSubMessage.new(...).to_dict()`` for callers that only need the dict.
+
+        :param topic: Topic of the message
+        :param message: Message content
+        :param producer: Producer name
+        :param message_id: Unique message ID (optional, defaults to a random hex ID)
+        :return: Dictionary representation of the message
+        """
+        return {TOPIC_KEY: topic, MESSAGE_ID_KEY: message_id or new_message_id(),
+                MESSAGE_KEY: message, PRODUCER_KEY: producer}
+
     def to_dict(self) -> Dict[str, Any]:
         """
         Convert the message to a dictionary.
 
         :return: Dictionary representation of the message
         """
-        return asdict(self)
+        return {TOPIC_KEY: self.topic, MESSAGE_ID_KEY: self.message_id,
+                MESSAGE_KEY: self.message, PRODUCER_KEY: self.producer}
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the message straight to its JSON wire form.
+
+        orjson reads the dataclass fields directly, so no intermediate dict is built.
+
+        :return: UTF-8 encoded JSON representation of the message
+        """
+        return dumps_bytes(self)
@@ -1,21 +1,92 @@
 # pubsub_ws.py
 
-import json
+import gzip
+import hashlib
 import logging
+import math
+import mimetypes
 import sqlite3
+import threading
 import time
+import zlib
+from collections import defaultdict, deque
+from itertools import islice
 from os import path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import (
+    Any, DefaultDict, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+)
 
 import flask
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, jsonify, request
+from flask.json.provider import JSONProvider
 from flask_socketio import SocketIO, emit, join_room
+from werkzeug.security import safe_join
+
+from pubsub.pubsub_json import OrjsonModule, dumps_bytes
 
 # Configure logging for debugging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Applied to every connection the server opens: WAL so readers never block the writer,
+# one fsync per checkpoint instead of per commit, a 20 MB page cache and 256 MB of mmap
+CONNECTION_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA busy_timeout=5000;
+    PRAGMA cache_size=-20000;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=268435456;
+"""
+
+
+# Message bodies at least this large (encoded) are stored zlib-compressed as BLOBs
+COMPRESS_MIN_SIZE = 1024
+_COMPRESS_LEVEL = 1  # Cheapest level: most of the gain on JSON for a fraction of the CPU
+
+
+def encode_body(message: Any) -> Union[str, bytes]:
+    """
+    Encode a message body for storage.
+
+    Small bodies are kept as JSON text; larger ones are compressed and stored as a BLOB, which
+    SQLite keeps as-is in the TEXT ``message`` columns.
+    """
+    encoded = dumps_bytes(message)
+    if len(encoded) >= COMPRESS_MIN_SIZE:
+        return zlib.compress(encoded, _COMPRESS_LEVEL)
+    return encoded.decode()
+
+
+def decode_body(stored: Union[str, bytes]) -> Any:
+    """Decode a message body written by ``encode_body``."""
+    if isinstance(stored, bytes):
+        stored = zlib.decompress(stored)
+    return OrjsonModule.loads(stored)
+
+
+def raw_body(stored: Union[str, bytes]) -> bytes:
+    """JSON bytes of a message body written by ``encode_body``, without parsing it."""
+    if isinstance(stored, bytes):
+        return zlib.decompress(stored)
+    return stored.encode()
+
+
+# Row shapes of /messages and /consumptions, filled with already-encoded JSON values so that
+# stored bodies are spliced in as-is instead of being parsed and encoded again
+_MESSAGE_JSON = b'{"topic":%b,"message_id":%b,"message":%b,"producer":%b,"timestamp":%b}'
+_CONSUMPTION_JSON = (
+    b'{"consumer":%b,"topic":%b,"message_id":%b,"message":%b,"timestamp":%b}')
+# Compact form (``?rows=1``): the same five fields as an array, in the order of the keys above
+_ROW_JSON = b"[%b,%b,%b,%b,%b]"
+
+
+# Migrations written to be re-runnable (IF NOT EXISTS), applied on every start so that
+# existing databases pick them up too
+IDEMPOTENT_MIGRATIONS = ["migrations/002_add_recent_rows_indexes.sql"]
+
+
 # --- START MODIFICATION FOR DB MANAGEMENT AND TESTS ---
 def init_db(db_name: str, connection: Optional[sqlite3.Connection] = None) -> None:
     """Initialize the SQLite database and run migrations if necessary."""
@@ -27,18 +98,25 @@ def init_db(db_name: str, connection: Optional[sqlite3.Connection] = None) -> No
         close_conn = True  # Close connection if created here
 
     try:
+        conn.executescript(CONNECTION_PRAGMAS)  # journal_mode=WAL is persisted in the file
         c = conn.cursor()
         c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='messages'")
         if not c.fetchone():
             logger.info(
-                f"[INIT DB] Messages table missing in {db_name}, running migration script...")
+                "[INIT DB] Messages table missing in %s, running migration script...", db_name)
             migration_script = "migrations/001_add_message_id_and_producer.sql"
             if path.exists(migration_script):
                 with open(migration_script) as f:
                     conn.executescript(f.read())
-                    logger.info(f"[INIT DB] Migration script executed successfully for {db_name}.")
+                    logger.info("[INIT DB] Migration script executed successfully for %s.", db_name)
+            else:
+                logger.error("[INIT DB] Migration script not found: %s", migration_script)
+        for migration_script in IDEMPOTENT_MIGRATIONS:
+            if path.exists(migration_script):
+                with open(migration_script) as f:
+                    conn.executescript(f.read())
             else:
-                logger.error(f"[INIT DB] Migration script not found: {migration_script}")
+                logger.error("[INIT DB] Migration script not found: %s", migration_script)
     finally:
         if close_conn and conn:  # Close connection only if it was opened here
             conn.close()
@@ -48,10 +126,41 @@ def init_db(db_name: str, connection: Optional[sqlite3.Connection] = None) -> No
 DB_FILE_NAME = "pubsub.db"
 # --- END MODIFICATION FOR DB MANAGEMENT AND TESTS ---
 
+# Page size of /messages and /consumptions when no limit is given, and the largest allowed
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Longest a listing waits for the writer thread to store the queued rows before reading anyway
+READ_FLUSH_TIMEOUT = 1.0
+
+# Errors that condemn a single row: a constraint violation, or a value SQLite cannot bind
+# (ProgrammingError on Python 3.11+, InterfaceError before). Anything else, such as "database
+# is locked" or a disk I/O error, is transient and the rows are written by a later flush
+_ROW_ERRORS = (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError,
+               sqlite3.DataError)
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, used by ``jsonify`` and ``request.json``."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return OrjsonModule.dumps(obj)
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        return OrjsonModule.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> flask.Response:
+        # Hand the encoded bytes to the response as-is, skipping the str round trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype="application/json")
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.config["SECRET_KEY"] = "secret!"
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet")
+# Room emits are encoded once per packet by the Socket.IO manager; orjson makes that encode
+# cheap while keeping text frames that the browser client can read
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet", json=OrjsonModule)
 
 # Initialize the real database when starting the application
 if __name__ == "__main__":
@@ -59,222 +168,544 @@ if __name__ == "__main__":
 
 
 class Broker:
+    # SQL issued by the broker. sqlite3 keeps the compiled statement of each distinct string in
+    # a per-connection cache, so reusing these constants skips SQLite's parser and planner
+    _SQL_INSERT_MESSAGE = """
+        INSERT INTO messages (topic, message_id, message, producer, timestamp)
+        VALUES (?, ?, ?, ?, ?)
+    """
+    _SQL_INSERT_CONSUMPTION = """
+        INSERT INTO consumptions (consumer, topic, message_id, message, timestamp)
+        VALUES (?, ?, ?, ?, ?)
+    """
+    # Keyset pagination: rows older than a timestamp, newest first (LIMIT -1 means no limit)
+    _SQL_SELECT_MESSAGES = """
+        SELECT topic, message_id, message, producer, timestamp FROM messages
+        WHERE message_id IS NOT NULL AND timestamp < ?
+        ORDER BY timestamp DESC
+        LIMIT ?
+    """
+    _SQL_SELECT_CONSUMPTIONS = """
+        SELECT consumer, topic, message_id, message, timestamp FROM consumptions
+        WHERE message_id IS NOT NULL AND timestamp < ?
+        ORDER BY timestamp DESC
+        LIMIT ?
+    """
 
     # The broker can receive an existing connection for tests
-    def __init__(self, db_name: str, test_conn: Optional[sqlite3.Connection] = None):
+    def __init__(self, db_name: str, test_conn: Optional[sqlite3.Connection] = None,
+                 flush_interval: float = 0.005, flush_batch_size: int = 256,
+                 synchronous_writes: bool = False, event_batch_interval: float = 0.01,
+                 recent_cache_size: int = 1000, max_pending_messages: int = 10000):
         """
         Initialize the Broker with a database name.
 
+        Messages and consumptions are queued in memory and written in batches by ``flush``,
+        from the background writer thread (see ``start_writer``), which is woken early once
+        ``flush_batch_size`` rows are waiting or a read needs the queued rows. Without that
+        thread, the flush runs in the caller. With ``synchronous_writes`` every save is
+        committed before it returns instead.
+
         :param db_name: Name of the SQLite database file (or ':memory:')
         :param test_conn: An optional existing SQLite connection for testing purposes.
+        :param flush_interval: Seconds between two flushes of the background writer
+        :param flush_batch_size: Number of queued messages or consumptions forcing a flush
+        :param synchronous_writes: Commit each message and consumption as it is saved
+        :param event_batch_interval: Seconds over which monitoring events are coalesced once
+            ``start_event_batching`` has been called
+        :param recent_cache_size: Number of newest messages and consumptions kept in memory
+            to serve the listing routes without querying SQLite
+        :param max_pending_messages: Queued messages past which ``backlog_full`` reports
+            that publishers should back off
         """
         self.db_name = db_name
         self._test_conn = test_conn  # Store test connection
+        self._conn: Optional[sqlite3.Connection] = None  # Long-lived writer, opened lazily
+        self._local = threading.local()  # Per-thread reader connections
+        self._readers: List[sqlite3.Connection] = []
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self.synchronous_writes = synchronous_writes
+        self.event_batch_interval = event_batch_interval
+        self.recent_cache_size = recent_cache_size
+        self.max_pending_messages = max_pending_messages
+        self._pending_messages: Deque[Tuple[Any, ...]] = deque()
+        self._pending_consumptions: Deque[Tuple[Any, ...]] = deque()
+        self._write_lock = threading.Lock()
+        # "messages"/"consumptions" → newest stored rows first, loaded on the first listing
+        self._recent: Dict[str, Deque[Tuple[Any, ...]]] = {}
+
+        # Runtime-only subscription state: SIDs do not survive a restart, so it is not persisted
+        self._subs: Dict[str, Dict[str, Tuple[str, float]]] = {}  # sid → topic → (consumer, ts)
+        self._topic_sids: DefaultDict[str, Set[str]] = defaultdict(set)  # topic → sids
+        self._writer_running = False
+        self._writer_thread: Optional[threading.Thread] = None
+        self._writer_wake = threading.Event()
+        # Flushes begun and finished, so that a read can wait for one started after it
+        self._flushes_started = 0
+        self._flushes_done = 0
+        self._batching_events = False
+        self._events: Dict[str, List[Dict[str, Any]]] = {}  # event → payloads waiting to be sent
 
     def _get_db_connection(self) -> sqlite3.Connection:
-        """Helper to get a database connection. Uses test_conn if available."""
+        """Helper to get the database connection. Uses test_conn if available."""
         if self._test_conn:
             return self._test_conn  # Return test connection
-        return sqlite3.connect(self.db_name)
+        if self._conn is None:
+            # Autocommit mode: flush opens its transactions explicitly with BEGIN IMMEDIATE
+            self._conn = sqlite3.connect(self.db_name, check_same_thread=False,
+                                         isolation_level=None)
+            self._conn.executescript(CONNECTION_PRAGMAS)
+        return self._conn
+
+    def _get_read_connection(self) -> sqlite3.Connection:
+        """
+        Get this thread's connection for SELECT queries.
 
-    def _close_db_connection(self, conn: sqlite3.Connection) -> None:
-        """Helper to close a database connection, if it's not a test connection."""
-        if conn != self._test_conn:  # Don't close test connection
+        Readers are kept apart from the writer connection so that, with WAL, reads never wait
+        on a flush. In-memory databases are private to a connection and share the writer.
+        """
+        if self._test_conn or self.db_name == ":memory:":
+            return self._get_db_connection()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_name, check_same_thread=False)
+            conn.executescript(CONNECTION_PRAGMAS)
+            conn.execute("PRAGMA query_only=ON")
+            self._local.conn = conn
+            self._readers.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Stop the background writer, flush pending rows and close every connection."""
+        self._writer_running = False
+        self._batching_events = False
+        self.flush_events()
+        if self._writer_thread is not None:
+            self._writer_wake.set()
+            self._writer_thread.join()
+            self._writer_thread = None
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        for conn in self._readers:
             conn.close()
+        self._readers.clear()
+        self._local = threading.local()
+
+    def start_writer(self) -> None:
+        """
+        Start the writer thread flushing queued rows every ``flush_interval`` seconds.
+
+        A real OS thread rather than a green thread: SQLite releases the GIL while it commits
+        and fsyncs, so Socket.IO greenlets keep being served during writes.
+        """
+        if self._writer_running:
+            return
+        self._writer_running = True
+        self._writer_thread = threading.Thread(target=self._writer_loop, name="broker-writer",
+                                               daemon=True)
+        self._writer_thread.start()
+
+    def _writer_loop(self) -> None:
+        while self._writer_running:
+            self._writer_wake.wait(self.flush_interval)
+            self._writer_wake.clear()
+            self.flush()
+
+    def backlog_full(self) -> bool:
+        """Whether the writer has fallen so far behind that new messages should be refused."""
+        return len(self._pending_messages) >= self.max_pending_messages
+
+    def start_event_batching(self) -> None:
+        """
+        Coalesce the monitoring events (``new_message``, ``new_consumption``, ``new_client``,
+        ``client_disconnected``) into one ``<event>_batch`` emit per ``event_batch_interval``.
 
-    def register_subscription(self, sid: str, consumer: str, topic: str) -> None:
-        conn = None
+        Runs as a Socket.IO background task, so the emits stay on the server's event loop.
+        """
+        if self._batching_events:
+            return
+        self._batching_events = True
+        socketio.start_background_task(self._event_loop)
+
+    def _event_loop(self) -> None:
+        while self._batching_events:
+            socketio.sleep(self.event_batch_interval)
+            self.flush_events()
+
+    def flush_events(self) -> None:
+        """Emit every buffered monitoring event, one list per event type."""
+        events, self._events = self._events, {}
+        for event, payloads in events.items():
+            socketio.emit(event + "_batch", payloads)
+
+    def _emit_event(self, event: str, payload: Dict[str, Any]) -> None:
+        if self._batching_events:
+            self._events.setdefault(event, []).append(payload)
+        else:
+            socketio.emit(event, payload)
+
+    def _request_flush(self) -> None:
+        """Wake the writer thread when it runs, otherwise flush right away."""
+        if self._writer_thread is not None:
+            self._writer_wake.set()
+        else:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write every queued message and consumption in one transaction.
+
+        If a row is rejected, the batch is written again row by row, so a bad row only loses
+        itself and not the rows queued alongside it. On a transient error the rows go back to
+        the head of the queues for the next flush.
+        """
+        with self._write_lock:
+            self._flushes_started += 1
+            try:
+                self._flush_pending()
+            finally:
+                self._flushes_done += 1
+
+    def _flush_pending(self) -> None:
+        """Write the queued rows; ``flush`` holds the write lock around it."""
+        messages = [self._pending_messages.popleft()
+                    for _ in range(len(self._pending_messages))]
+        consumptions = [self._pending_consumptions.popleft()
+                        for _ in range(len(self._pending_consumptions))]
+        if not messages and not consumptions:
+            return
+
+        conn = self._get_db_connection()
         try:
-            conn = self._get_db_connection()
-            c = conn.cursor()
-            c.execute(
-                """
-                INSERT OR REPLACE INTO subscriptions (sid, consumer, topic, connected_at)
-                VALUES (?, ?, ?, ?)
-            """,
-                (sid, consumer, topic, time.time()),
-            )
+            _begin_write(conn)
+            if messages:
+                conn.executemany(self._SQL_INSERT_MESSAGE, messages)
+            if consumptions:
+                conn.executemany(self._SQL_INSERT_CONSUMPTION, consumptions)
             conn.commit()
-            logger.info(f"Registered subscription: {consumer} to {topic} (SID: {sid})")
-
-            socketio.emit(
-                "new_client",
-                {"consumer": consumer, "topic": topic, "connected_at": time.time()},
-                # Add timestamp for the UI
-            )
+            logger.info(
+                "Flushed %d messages and %d consumptions", len(messages), len(consumptions))
+        except _ROW_ERRORS as e:
+            conn.rollback()
+            logger.warning("Batch flush failed (%s), retrying row by row", e)
+            self._flush_rows(conn, messages, consumptions)
         except sqlite3.Error as e:
-            logger.error(f"Database error during subscription registration: {e}")
-            if conn:
-                conn.rollback()  # Rollback on error
-        finally:
-            if conn:
-                self._close_db_connection(conn)  # Use the new close method
+            conn.rollback()
+            self._requeue(messages, consumptions, e)
 
-    def unregister_client(self, sid: str) -> None:
-        conn = None
+    def _flush_rows(self, conn: sqlite3.Connection, messages: List[Tuple[Any, ...]],
+                    consumptions: List[Tuple[Any, ...]]) -> None:
+        """
+        Write rows one statement at a time, logging the message_id of each rejected row.
+
+        The recent-rows cache was filled as the rows were saved, so it is dropped for a table
+        that lost rows and reloaded from SQLite by the next listing.
+        """
+        rejected: Set[int] = set()  # id() of the rejected rows
         try:
-            conn = self._get_db_connection()
-            c = conn.cursor()
-            c.execute("SELECT consumer, topic FROM subscriptions WHERE sid = ?", (sid,))
-            client_data = c.fetchall()
-            c.execute("DELETE FROM subscriptions WHERE sid = ?", (sid,))
+            _begin_write(conn)
+            # A failed INSERT only undoes its own statement, the transaction carries on
+            for sql, rows, what in ((self._SQL_INSERT_MESSAGE, messages, "messages"),
+                                    (self._SQL_INSERT_CONSUMPTION, consumptions, "consumptions")):
+                for row in rows:
+                    try:
+                        conn.execute(sql, row)
+                    except _ROW_ERRORS as e:
+                        rejected.add(id(row))
+                        message_id = row[1] if what == "messages" else row[2]
+                        logger.error("Rejected %s %s: %s", what[:-1], message_id, e)
+                        self._recent.pop(what, None)
             conn.commit()
-            for consumer, topic in client_data:
-                logger.info(f"Unregistered client: {consumer} from {topic} (SID: {sid})")
-                socketio.emit("client_disconnected", {"consumer": consumer, "topic": topic})
         except sqlite3.Error as e:
-            logger.error(f"Database error during client unregistration: {e}")
-            if conn:
-                conn.rollback()
-        finally:
-            if conn:
-                self._close_db_connection(conn)
+            conn.rollback()
+            self._requeue([row for row in messages if id(row) not in rejected],
+                          [row for row in consumptions if id(row) not in rejected], e)
+
+    def _requeue(self, messages: List[Tuple[Any, ...]], consumptions: List[Tuple[Any, ...]],
+                 error: sqlite3.Error) -> None:
+        """Put rows a transient error kept out of SQLite back at the head of the queues."""
+        logger.warning("Database error during flush, %d messages and %d consumptions requeued: %s",
+                       len(messages), len(consumptions), error)
+        self._pending_messages.extendleft(reversed(messages))
+        self._pending_consumptions.extendleft(reversed(consumptions))
+
+    def _wait_for_writer(self) -> None:
+        """
+        Get the queued rows stored before a read.
+
+        With the writer thread running, the commit and its fsync stay on that thread: it is
+        woken, and the calling greenlet yields to the hub until a flush begun after this call
+        has finished, for at most ``READ_FLUSH_TIMEOUT`` seconds. Without it, flush here.
+        """
+        if not self._pending_messages and not self._pending_consumptions:
+            return
+        if self._writer_thread is None:
+            self.flush()
+            return
+        target = self._flushes_started + 1
+        self._writer_wake.set()
+        deadline = time.monotonic() + READ_FLUSH_TIMEOUT
+        while self._flushes_done < target:
+            if time.monotonic() >= deadline:
+                logger.warning("Writer still busy, reading without the latest queued rows")
+                return
+            socketio.sleep(0.001)
+
+    def register_subscription(self, sid: str, consumer: str, topic: str,
+                              connected_at: Optional[float] = None) -> None:
+        if connected_at is None:
+            connected_at = time.time()
+        self._emit_event("new_client", self._add_subscription(sid, consumer, topic, connected_at))
+
+    def register_subscriptions(self, sid: str, consumer: str, topics: List[str],
+                               connected_at: Optional[float] = None) -> None:
+        """Register every topic of one subscribe request, announced in a single emit."""
+        if connected_at is None:
+            connected_at = time.time()
+        clients = [self._add_subscription(sid, consumer, topic, connected_at) for topic in topics]
+        if self._batching_events:
+            self._events.setdefault("new_client", []).extend(clients)
+        elif clients:
+            socketio.emit("new_client_batch", clients)
+
+    def _add_subscription(self, sid: str, consumer: str, topic: str,
+                          connected_at: float) -> Dict[str, Any]:
+        self._subs.setdefault(sid, {})[topic] = (consumer, connected_at)
+        self._topic_sids[topic].add(sid)
+        logger.info("Registered subscription: %s to %s (SID: %s)", consumer, topic, sid)
+        return {"consumer": consumer, "topic": topic, "connected_at": connected_at}
+
+    def unregister_client(self, sid: str) -> None:
+        subscriptions = self._subs.pop(sid, {})
+        for topic, (consumer, _) in subscriptions.items():
+            sids = self._topic_sids.get(topic)
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del self._topic_sids[topic]
+            logger.info("Unregistered client: %s from %s (SID: %s)", consumer, topic, sid)
+            self._emit_event("client_disconnected", {"consumer": consumer, "topic": topic})
 
     def save_message(self, topic: str, message_id: str, message: Any, producer: str) -> None:
-        conn = None
         timestamp = time.time()
-        try:
-            conn = self._get_db_connection()
-            c = conn.cursor()
-            c.execute(
-                """
-                INSERT INTO messages (topic, message_id, message, producer, timestamp)
-                VALUES (?, ?, ?, ?, ?)
-            """,
-                (topic, message_id, json.dumps(message), producer, timestamp),
-            )
-            conn.commit()
-            logger.info(f"Saved message: {message_id} to topic {topic} by {producer}")
-
-            socketio.emit(
-                "new_message",
-                {
-                    "topic": topic,
-                    "message_id": message_id,
-                    "message": message,
-                    "producer": producer,
-                    "timestamp": timestamp,
-                },
-            )
-        except sqlite3.Error as e:
-            logger.error(f"Database error during message save: {e}")
-            if conn:
-                conn.rollback()
-        finally:
-            if conn:
-                self._close_db_connection(conn)
+        row = (topic, message_id, encode_body(message), producer, timestamp)
+        pending = self._pending_messages
+        pending.append(row)
+        self._remember("messages", row, message_id)
+        logger.info("Queued message: %s to topic %s by %s", message_id, topic, producer)
+        if self.synchronous_writes:
+            self.flush()
+        elif len(pending) >= self.flush_batch_size:
+            self._request_flush()
+
+        self._emit_event(
+            "new_message",
+            {
+                "topic": topic,
+                "message_id": message_id,
+                "message": message,
+                "producer": producer,
+                "timestamp": timestamp,
+            },
+        )
 
     def save_consumption(self, consumer: str, topic: str, message_id: str, message: Any) -> None:
-        conn = None
         timestamp = time.time()
-        try:
-            conn = self._get_db_connection()
-            c = conn.cursor()
-            c.execute(
-                """
-                INSERT INTO consumptions (consumer, topic, message_id, message, timestamp)
-                VALUES (?, ?, ?, ?, ?)
-            """,
-                (consumer, topic, message_id, json.dumps(message), timestamp),
-            )
-            conn.commit()
-            logger.info(f"Saved consumption: {consumer} consumed {message_id} from {topic}")
-
-            socketio.emit(
-                "new_consumption",
-                {
-                    "consumer": consumer,
-                    "topic": topic,
-                    "message_id": message_id,
-                    "message": message,
-                    "timestamp": timestamp,
-                },
-            )
-        except sqlite3.Error as e:
-            logger.error(f"Database error during consumption save: {e}")
-            if conn:
-                conn.rollback()
-        finally:
-            if conn:
-                self._close_db_connection(conn)
+        row = (consumer, topic, message_id, encode_body(message), timestamp)
+        pending = self._pending_consumptions
+        pending.append(row)
+        self._remember("consumptions", row, message_id)
+        logger.info("Queued consumption: %s consumed %s from %s", consumer, message_id, topic)
+        if self.synchronous_writes:
+            self.flush()
+        elif len(pending) >= self.flush_batch_size:
+            self._request_flush()
+
+        self._emit_event(
+            "new_consumption",
+            {
+                "consumer": consumer,
+                "topic": topic,
+                "message_id": message_id,
+                "message": message,
+                "timestamp": timestamp,
+            },
+        )
+
+    def message_rooms(self, topic: str) -> Optional[str]:
+        """
+        Room a message published on ``topic`` is emitted to, from the in-memory membership.
+
+        ``None`` means nobody would receive the message, so the emit can be skipped.
+        """
+        return topic if topic in self._topic_sids else None
 
     # noinspection PyShadowingNames
-    def get_clients(self) -> List[Dict[str, Any]]:
-        conn = None
-        try:
-            conn = self._get_db_connection()
-            c = conn.cursor()
-            c.execute(
-                """
-                SELECT consumer, topic, connected_at FROM subscriptions
-            """
-            )
-            rows = c.fetchall()
-            clients = [{"consumer": r[0], "topic": r[1], "connected_at": r[2]} for r in rows]
-            logger.info(f"Retrieved {len(clients)} connected clients")
-            return clients
-        except sqlite3.Error as e:
-            logger.error(f"Database error retrieving clients: {e}")
-            return []
-        finally:
-            if conn:
-                self._close_db_connection(conn)
+    def get_clients(self, as_rows: bool = False) -> List[Any]:
+        """
+        List every subscription of the connected clients.
+
+        :param as_rows: Return ``[consumer, topic, connected_at]`` lists instead of dicts
+        """
+        entries = ((consumer, topic, connected_at)
+                   for topics in self._subs.values()
+                   for topic, (consumer, connected_at) in topics.items())
+        if as_rows:
+            clients: List[Any] = [list(entry) for entry in entries]
+        else:
+            clients = [{"consumer": consumer, "topic": topic, "connected_at": connected_at}
+                       for consumer, topic, connected_at in entries]
+        logger.debug("Retrieved %d connected clients", len(clients))
+        return clients
 
     # noinspection PyShadowingNames
-    def get_messages(self) -> List[Dict[str, Any]]:
-        conn = None
-        try:
-            conn = self._get_db_connection()
-            c = conn.cursor()
-            c.execute(
-                """
-                SELECT topic, message_id, message, producer, timestamp FROM messages
-                WHERE message_id IS NOT NULL
-                ORDER BY timestamp DESC
-            """
-            )
-            rows = c.fetchall()
-            messages = [
-                {"topic": r[0], "message_id": r[1], "message": json.loads(r[2]), "producer": r[3],
-                 "timestamp": r[4]}
-                for r in rows
-            ]
-            logger.info(f"Retrieved {len(messages)} messages")
-            return messages
-        except sqlite3.Error as e:
-            logger.error(f"Database error retrieving messages: {e}")
-            return []
-        finally:
-            if conn:
-                self._close_db_connection(conn)
+    def get_messages(self, before: Optional[float] = None,
+                     limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        messages = list(self.iter_messages(before, limit))
+        logger.debug("Retrieved %d messages", len(messages))
+        return messages
+
+    def iter_messages(self, before: Optional[float] = None,
+                      limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield stored messages, newest first, straight from the cursor.
+
+        :param before: Only return messages older than this timestamp
+        :param limit: Maximum number of messages to return (all when None)
+        """
+        for r in self._page(self._SQL_SELECT_MESSAGES, before, limit, "messages"):
+            yield {"topic": r[0], "message_id": r[1], "message": decode_body(r[2]),
+                   "producer": r[3], "timestamp": r[4]}
+
+    def iter_messages_json(self, before: Optional[float] = None, limit: Optional[int] = None,
+                           as_rows: bool = False) -> Iterator[bytes]:
+        """
+        Like ``iter_messages``, but yield each message already encoded as JSON.
+
+        :param as_rows: Encode each message as an array of its field values instead of an object
+        """
+        template = _ROW_JSON if as_rows else _MESSAGE_JSON
+        for r in self._page(self._SQL_SELECT_MESSAGES, before, limit, "messages"):
+            yield template % (dumps_bytes(r[0]), dumps_bytes(r[1]), raw_body(r[2]),
+                              dumps_bytes(r[3]), dumps_bytes(r[4]))
 
     # noinspection PyShadowingNames
-    def get_consumptions(self) -> List[Dict[str, Any]]:
-        conn = None
+    def get_consumptions(self, before: Optional[float] = None,
+                         limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        consumptions = list(self.iter_consumptions(before, limit))
+        logger.debug("Retrieved %d consumption events", len(consumptions))
+        return consumptions
+
+    def iter_consumptions(self, before: Optional[float] = None,
+                          limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield stored consumptions, newest first, straight from the cursor.
+
+        :param before: Only return consumptions older than this timestamp
+        :param limit: Maximum number of consumptions to return (all when None)
+        """
+        for r in self._page(self._SQL_SELECT_CONSUMPTIONS, before, limit, "consumptions"):
+            yield {"consumer": r[0], "topic": r[1], "message_id": r[2],
+                   "message": decode_body(r[3]), "timestamp": r[4]}
+
+    def iter_consumptions_json(self, before: Optional[float] = None,
+                               limit: Optional[int] = None,
+                               as_rows: bool = False) -> Iterator[bytes]:
+        """
+        Like ``iter_consumptions``, but yield each consumption already encoded as JSON.
+
+        :param as_rows: Encode each consumption as an array of its field values instead of an
+            object
+        """
+        template = _ROW_JSON if as_rows else _CONSUMPTION_JSON
+        for r in self._page(self._SQL_SELECT_CONSUMPTIONS, before, limit, "consumptions"):
+            yield template % (dumps_bytes(r[0]), dumps_bytes(r[1]), dumps_bytes(r[2]),
+                              raw_body(r[3]), dumps_bytes(r[4]))
+
+    def _remember(self, what: str, row: Tuple[Any, ...], message_id: Optional[str]) -> None:
+        recent = self._recent.get(what)
+        if recent is not None and message_id is not None:  # Same filter as the listing queries
+            recent.appendleft(row)
+
+    def _page(self, sql: str, before: Optional[float], limit: Optional[int],
+              what: str) -> Iterable[Tuple[Any, ...]]:
+        """
+        Rows of one listing page, newest first, served from the recent-rows cache when it
+        covers the page and from SQLite otherwise.
+
+        The cache is loaded from SQLite on first use, then kept current by the saves. It holds
+        every stored row for as long as it is not full.
+        """
+        recent = self._recent.get(what)
+        if recent is None:
+            recent = self._recent[what] = deque(
+                self._select_page(sql, None, self.recent_cache_size, what),
+                maxlen=self.recent_cache_size)
+        rows = recent if before is None else (r for r in recent if r[-1] < before)
+        page = list(islice(rows, limit))
+        if len(page) == limit or len(recent) < self.recent_cache_size:
+            return page
+        return self._select_page(sql, before, limit, what)
+
+    def _select_page(self, sql: str, before: Optional[float], limit: Optional[int],
+                     what: str) -> Iterator[Tuple[Any, ...]]:
+        self._wait_for_writer()  # Make queued rows visible
         try:
-            conn = self._get_db_connection()
-            c = conn.cursor()
-            c.execute(
-                """
-                SELECT consumer, topic, message_id, message, timestamp FROM consumptions
-                WHERE message_id IS NOT NULL
-                ORDER BY timestamp DESC
-            """
-            )
-            rows = c.fetchall()
-            consumptions = [
-                {"consumer": r[0], "topic": r[1], "message_id": r[2], "message": json.loads(r[3]),
-                 "timestamp": r[4]}
-                for r in rows
-            ]
-            logger.info(f"Retrieved {len(consumptions)} consumption events")
-            return consumptions
+            yield from self._get_read_connection().execute(sql, _page_params(before, limit))
         except sqlite3.Error as e:
-            logger.error(f"Database error retrieving consumptions: {e}")
-            return []
-        finally:
-            if conn:
-                self._close_db_connection(conn)
+            logger.error("Database error retrieving %s: %s", what, e)
+
+
+def _begin_write(conn: sqlite3.Connection) -> None:
+    """
+    Open a write transaction on the broker's autocommit writer connection.
+
+    The write lock is taken upfront rather than by upgrading a read lock mid-transaction,
+    which can fail with SQLITE_BUSY under concurrent readers.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+def _page_params(before: Optional[float], limit: Optional[int]) -> Tuple[float, int]:
+    """Bind values for the keyset pagination of the listing queries."""
+    return (math.inf if before is None else before), (-1 if limit is None else limit)
+
+
+def _page_args() -> Tuple[Optional[float], int]:
+    """Read ``before`` and ``limit`` from the query string, clamping ``limit``."""
+    before = request.args.get("before", type=float)
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    return before, min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+def _rows_arg() -> bool:
+    """Whether ``?rows=1`` asks for each row as an array of its values rather than an object."""
+    return request.args.get("rows") == "1"
+
+
+def stream_json_array(items: Iterable[bytes], chunk_size: int = 256) -> Iterator[bytes]:
+    """
+    Join already-encoded JSON values into an array, yielding it ``chunk_size`` values at a time.
+
+    Only one chunk is held in memory at a time, and grouping elements keeps the number of
+    socket writes low.
+    """
+    yield b"["
+    chunk: List[bytes] = []
+    first = True
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield (b"" if first else b",") + b",".join(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield (b"" if first else b",") + b",".join(chunk)
+    yield b"]"
 
 
 # Create the Broker instance with the real database filename
@@ -283,58 +714,171 @@ class Broker:
 broker = Broker(DB_FILE_NAME)
 
 
-@app.route("/publish", methods=["POST"])
-def publish() -> Tuple[Dict[str, str], int]:
-    data = request.json
+PublishFields = Tuple[str, str, Any, str]  # topic, message_id, message, producer
+
+
+def _publish_fields(data: Any) -> Optional[PublishFields]:
+    """
+    Validate a decoded publish body in a single pass.
+
+    Any JSON value other than null is a valid message, including ``""``, ``0`` and ``false``;
+    topic, message_id and producer must be non-empty strings. Anything else would be refused
+    by SQLite only at flush time, long after the publisher was answered, or cannot key a room.
+
+    :return: The topic, message_id, message and producer, or None if any is missing or invalid
+    """
+    if not isinstance(data, dict):
+        return None
     topic = data.get("topic")
     message_id = data.get("message_id")
     message = data.get("message")
     producer = data.get("producer")
+    if message is None:
+        return None
+    for field in (topic, message_id, producer):
+        if not field or not isinstance(field, str):
+            return None
+    return topic, message_id, message, producer
+
+
+def _deliver(topic: str, message_id: str, message: Any, producer: str) -> None:
+    """Store a published message and emit it to its subscribers, if it has any."""
+    broker.save_message(topic=topic, message_id=message_id, message=message, producer=producer)
+
+    rooms = broker.message_rooms(topic)
+    if rooms is None:  # Skip encoding a payload nobody would receive
+        return
+
+    payload = {"topic": topic, "message_id": message_id, "message": message, "producer": producer}
+    socketio.emit("message", payload, to=rooms)
+
+
+def _busy() -> Tuple[flask.Response, int]:
+    logger.warning("Publish refused: too many messages waiting for the database writer")
+    return jsonify({"status": "error", "message": "Server busy, retry later"}), 503
 
-    if not all([topic, message_id, message, producer]):
+
+@app.route("/publish", methods=["POST"])
+def publish() -> Tuple[Dict[str, str], int]:
+    fields = _publish_fields(request.get_json(silent=True))
+
+    if fields is None:
         logger.error("Publish failed: Missing topic, message_id, message, or producer")
         return jsonify(
             {"status": "error", "message": "Missing topic, message_id, message, or producer"}), 400
 
-    logger.info(f"Publishing message {message_id} to topic {topic} by {producer}")
+    if broker.backlog_full():
+        return _busy()
+
+    topic, message_id, _, producer = fields
+    logger.info("Publishing message %s to topic %s by %s", message_id, topic, producer)
     # The real broker will be used here, not the mock
-    broker.save_message(topic=topic, message_id=message_id, message=message, producer=producer)
+    _deliver(*fields)
 
-    payload = {"topic": topic, "message_id": message_id, "message": message, "producer": producer}
+    return jsonify({"status": "ok"}), 200
 
-    socketio.emit("message", payload, to=topic)
 
-    return jsonify({"status": "ok"}), 200
+@app.route("/publish_batch", methods=["POST"])
+def publish_batch() -> Tuple[Dict[str, Any], int]:
+    batch = request.get_json(silent=True)
+
+    if not isinstance(batch, list):
+        logger.error("Batch publish failed: Expected a list of messages")
+        return jsonify({"status": "error", "message": "Expected a list of messages"}), 400
+
+    validated: List[PublishFields] = []
+    for data in batch:
+        fields = _publish_fields(data)
+        if fields is None:
+            logger.error("Batch publish failed: Missing topic, message_id, message, or producer")
+            return jsonify(
+                {"status": "error",
+                 "message": "Missing topic, message_id, message, or producer"}), 400
+        validated.append(fields)
+
+    if broker.backlog_full():
+        return _busy()
+
+    logger.info("Publishing batch of %d messages", len(validated))
+    for fields in validated:
+        _deliver(*fields)
+
+    return jsonify({"status": "ok", "count": len(validated)}), 200
 
 
 @app.route("/clients")
 def clients() -> flask.Response:
     logger.info("Fetching connected clients")
-    return jsonify(broker.get_clients())
+    return jsonify(broker.get_clients(as_rows=_rows_arg()))
 
 
 @app.route("/messages")
 def messages() -> flask.Response:
     logger.info("Fetching published messages")
-    return jsonify(broker.get_messages())
+    return flask.Response(
+        flask.stream_with_context(stream_json_array(
+            broker.iter_messages_json(*_page_args(), as_rows=_rows_arg()))),
+        mimetype="application/json")
 
 
 @app.route("/consumptions")
 def consumptions() -> flask.Response:
     logger.info("Fetching consumption events")
-    return jsonify(broker.get_consumptions())
+    return flask.Response(
+        flask.stream_with_context(stream_json_array(
+            broker.iter_consumptions_json(*_page_args(), as_rows=_rows_arg()))),
+        mimetype="application/json")
+
+
+# Files served from memory: path → (body, gzipped body, etag), read on their first request
+_assets: Dict[str, Tuple[bytes, bytes, str]] = {}
+
+
+def _load_asset(directory: str, filename: str) -> Optional[Tuple[bytes, bytes, str]]:
+    file_path = safe_join(path.join(app.root_path, directory), filename)
+    if file_path is None:
+        return None
+    cached = _assets.get(file_path)
+    if cached is None:
+        try:
+            with open(file_path, "rb") as f:
+                body = f.read()
+        except OSError:
+            return None
+        # Compressed once, so the slowest level costs nothing per request
+        cached = _assets[file_path] = (
+            body, gzip.compress(body, compresslevel=9), hashlib.sha1(body).hexdigest())
+    return cached
+
+
+def _send_asset(directory: str, filename: str) -> flask.Response:
+    """Send a cached file, gzipped when the client accepts it, answering If-None-Match."""
+    cached = _load_asset(directory, filename)
+    if cached is None:
+        flask.abort(404)
+    body, gzipped, etag = cached
+
+    response = flask.Response(
+        body, mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream")
+    if "gzip" in request.accept_encodings:
+        response.set_data(gzipped)
+        response.headers["Content-Encoding"] = "gzip"
+        etag += "-gzip"  # Each encoding is a distinct representation
+    response.vary.add("Accept-Encoding")
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
 
 @app.route("/client.html")
 def serve_client() -> flask.Response:
     logger.info("Serving client.html")
-    return send_from_directory(".", "client.html")
+    return _send_asset(".", "client.html")
 
 
 @app.route("/static/<path:filename>")
 def serve_static(filename: str) -> flask.Response:
-    logger.info(f"Serving static file: {filename}")
-    return send_from_directory("static", filename)
+    logger.info("Serving static file: %s", filename)
+    return _send_asset("static", filename)
 
 
 @socketio.on("subscribe")
@@ -349,20 +893,27 @@ def handle_subscribe(data: Dict[str, Any]) -> None:
         logger.error("No session ID available for subscription")
         return
 
-    logger.info(f"Subscribing {consumer} to topics {topics} (SID: {sid})")
+    logger.info("Subscribing %s to topics %s (SID: %s)", consumer, topics, sid)
+    sid, consumer = str(sid), str(consumer)
+    now = time.time()  # One clock read for the whole request
+    confirmation_id = f"sub_conf_{int(now)}"
     for topic in topics:
         join_room(topic)
-        broker.register_subscription(str(sid), str(consumer), topic)
-        emit(
-            "message",
+    broker.register_subscriptions(sid, consumer, topics, connected_at=now)
+    # One packet confirming every topic, as a list of regular "message" payloads
+    emit(
+        "message_batch",
+        [
             {
                 "topic": topic,
-                "message_id": f"sub_conf_{int(time.time())}",
+                "message_id": confirmation_id,
                 "message": f"Subscribed to {topic}",
                 "producer": "server",
-            },
-            to=sid,
-        )
+            }
+            for topic in topics
+        ],
+        to=sid,
+    )
 
 
 @socketio.on("consumed")
@@ -372,12 +923,14 @@ def handle_consumed(data: Dict[str, Any]) -> None:
     message_id = data.get("message_id")
     message = data.get("message")
 
-    if not all([consumer, topic, message_id, message]):
-        logger.warning(f"Incomplete consumption data received: {data}")
+    if message is None or not (consumer and topic and message_id):
+        logger.warning("Incomplete consumption data received: %s", data)
         return
 
-    logger.info(f"Handling consumption by {consumer} for message {message_id} in topic {topic}")
-    broker.save_consumption(str(consumer), str(topic), str(message_id), str(message))
+    logger.info(
+        "Handling consumption by %s for message %s in topic %s", consumer, message_id, topic)
+    # The message keeps its JSON type so it is stored and listed like the published one
+    broker.save_consumption(str(consumer), str(topic), str(message_id), message)
 
 
 @socketio.on("disconnect")
@@ -385,14 +938,19 @@ def handle_disconnect() -> None:  # <-- Signature without explicit argument for
     """Handle client disconnection."""
     # noinspection PyUnresolvedReferences
     sid = request.sid  # Always get SID via request.sid
-    logger.info(f"Client disconnected (SID: {sid})")
+    logger.info("Client disconnected (SID: %s)", sid)
     broker.unregister_client(sid)
 
 
 def main() -> None:
     """Entry point for the pubsub server."""
     logger.info("Starting Flask-SocketIO server on port 5000")
-    socketio.run(app, host="0.0.0.0", port=5000)  # nosec B104
+    broker.start_writer()
+    broker.start_event_batching()
+    try:
+        socketio.run(app, host="0.0.0.0", port=5000)  # nosec B104
+    finally:
+        broker.close()
 
 
 if __name__ == "__main__":
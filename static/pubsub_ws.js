@@ -75,7 +75,7 @@ document.addEventListener("DOMContentLoaded", () => {
             refreshConsumptions();
         });
 
-        socket.on("message", (data) => {
+        const onMessage = (data) => {
             console.log(`Message received: ${JSON.stringify(data)}`);
 
             // Display message in the "Received Messages" UI
@@ -91,7 +91,11 @@ document.addEventListener("DOMContentLoaded", () => {
                 message: data.message,
                 consumer: consumer
             });
-        });
+        };
+
+        socket.on("message", onMessage);
+        // Messages sent together, e.g. the confirmations of a subscribe
+        socket.on("message_batch", (messages) => messages.forEach(onMessage));
 
         // Handle disconnection
         socket.on("disconnect", () => {
@@ -119,6 +123,20 @@ document.addEventListener("DOMContentLoaded", () => {
             console.log(`New consumption: ${JSON.stringify(data)}`);
             refreshConsumptions();
         });
+
+        // The server coalesces the events above into one list per event type: refresh once
+        socket.on("new_message_batch", (events) => {
+            console.log(`${events.length} new message events received`);
+            refreshMessages();
+        });
+
+        socket.on("new_client_batch", () => refreshClients());
+        socket.on("client_disconnected_batch", () => refreshClients());
+
+        socket.on("new_consumption_batch", (events) => {
+            console.log(`${events.length} new consumptions`);
+            refreshConsumptions();
+        });
     });
 
     // Handle publish button click
@@ -0,0 +1,69 @@
+"""Fixtures shared by the broker test modules."""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add src to path - needs to be before local imports
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+# pubsub_ws is imported inside the fixtures: importing it builds the Flask-SocketIO server,
+# which the modules that never ask for these fixtures (test_basic, ...) must not pay for.
+
+
+@pytest.fixture(scope="module")
+def db_conn():
+    """Creates and initializes an in-memory SQLite database shared by the module's tests."""
+    from pubsub_ws import init_db
+
+    # Opened like the broker's own writer: autocommit, flush issues BEGIN IMMEDIATE itself
+    conn = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+    init_db(db_name=":memory:", connection=conn)
+    # Override the production PRAGMAs set by init_db: a RAM database needs no durability
+    conn.executescript(
+        """
+        PRAGMA journal_mode=MEMORY;
+        PRAGMA synchronous=OFF;
+        PRAGMA locking_mode=EXCLUSIVE;
+        PRAGMA mmap_size=0;
+    """
+    )
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def test_broker(db_conn):
+    """Creates a Broker instance using the in-memory database.
+
+    Kept per test: a Broker only holds in-memory state (subscriptions, write queues, the
+    recent-rows cache) that would otherwise leak between tests, and building one is cheap.
+    """
+    from pubsub_ws import Broker
+
+    broker = Broker(db_name=":memory:", test_conn=db_conn)
+    yield broker
+
+
+@pytest.fixture
+def socketio_test_client(test_broker, db_conn):
+    """Creates a Socket.IO test client for the Flask application."""
+    from pubsub_ws import app, socketio
+
+    # Note: This client is mainly useful for complete integration tests,
+    # not for directly testing handlers that manipulate `request.sid`.
+    # We keep it for its ability to send events and receive responses.
+    client = socketio.test_client(app)
+    yield client
+    client.disconnect()
+
+
+@pytest.fixture
+def flask_test_client(test_broker, db_conn):
+    """Creates a Flask test client for the application."""
+    from pubsub_ws import app
+
+    with app.test_client() as client:
+        yield client
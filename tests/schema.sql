@@ -0,0 +1,23 @@
+CREATE TABLE messages (
+    id INTEGER PRIMARY KEY,
+    topic TEXT NOT NULL,
+    message TEXT NOT NULL,
+    timestamp REAL DEFAULT (CURRENT_TIMESTAMP)
+);
+
+CREATE TABLE subscriptions (
+    id INTEGER PRIMARY KEY,
+    consumer TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    timestamp REAL DEFAULT (CURRENT_TIMESTAMP),
+    UNIQUE(consumer, topic)
+);
+
+CREATE TABLE consumptions (
+    id INTEGER PRIMARY KEY,
+    consumer TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    consumed_at REAL DEFAULT (CURRENT_TIMESTAMP),
+    FOREIGN KEY (message_id) REFERENCES messages (id),
+    UNIQUE(consumer, message_id)
+);
@@ -42,16 +42,16 @@ def in_memory_db():
 @pytest.fixture
 def mock_socketio_server(mocker):
     """Mock SocketIO server for testing."""
-    mock_server = mocker.MagicMock()
-    mock_server.emit = mocker.MagicMock()
-    mock_server.send = mocker.MagicMock()
+    mock_server = mocker.Mock()
+    mock_server.emit = mocker.Mock()
+    mock_server.send = mocker.Mock()
     return mock_server
 
 
 @pytest.fixture
 def mock_flask_app(mocker):
     """Mock Flask application for testing."""
-    mock_app = mocker.MagicMock()
+    mock_app = mocker.Mock()
     mock_app.config = {}
     return mock_app
 
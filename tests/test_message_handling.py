@@ -4,126 +4,137 @@ import sqlite3
 
 import pytest
 
+# Statements shared by the tests: one string each, so sqlite3's statement cache is hit
+SQL_INSERT_MESSAGE = "INSERT INTO messages (topic, message, producer) VALUES (?, ?, ?)"
+SQL_INSERT_SUBSCRIPTION = "INSERT OR IGNORE INTO subscriptions (consumer, topic) VALUES (?, ?)"
+SQL_INSERT_CONSUMPTION = "INSERT OR IGNORE INTO consumptions (consumer, message_id) VALUES (?, ?)"
+SQL_SELECT_TOPIC_MESSAGES = "SELECT topic, message, producer FROM messages WHERE topic = ?"
+SQL_SELECT_CONSUMER_TOPICS = "SELECT topic FROM subscriptions WHERE consumer = ?"
+
+SCHEMA_SQL = """
+    CREATE TABLE messages (
+        id INTEGER PRIMARY KEY,
+        topic TEXT NOT NULL,
+        message TEXT NOT NULL,
+        producer TEXT NOT NULL,
+        timestamp REAL DEFAULT (julianday('now'))
+    );
+
+    CREATE TABLE subscriptions (
+        id INTEGER PRIMARY KEY,
+        consumer TEXT NOT NULL,
+        topic TEXT NOT NULL,
+        timestamp REAL DEFAULT (julianday('now')),
+        UNIQUE(consumer, topic)
+    );
+
+    CREATE TABLE consumptions (
+        id INTEGER PRIMARY KEY,
+        consumer TEXT NOT NULL,
+        message_id INTEGER NOT NULL,
+        consumed_at REAL DEFAULT (julianday('now')),
+        FOREIGN KEY (message_id) REFERENCES messages (id),
+        UNIQUE(consumer, message_id)
+    );
+
+    -- subscriptions(consumer) is already covered by its UNIQUE(consumer, topic) index
+    CREATE INDEX idx_messages_topic ON messages (topic);
+    CREATE INDEX idx_consumptions_message_id ON consumptions (message_id);
+"""
+
 
 class TestMessageHandling:
     """Test message storage, retrieval, and consumption tracking."""
 
-    @pytest.fixture
-    def in_memory_db(self):
-        """Create an in-memory database with proper schema."""
-        conn = sqlite3.connect(":memory:")
-        cursor = conn.cursor()
-
-        # Create tables
-        cursor.execute(
+    @pytest.fixture(scope="class")
+    def shared_db(self):
+        """Create the in-memory database and its schema once for the whole class."""
+        # Autocommit mode: no implicit BEGIN; tests open their own transactions explicitly
+        conn = sqlite3.connect(":memory:", isolation_level=None, cached_statements=256)
+        conn.executescript(
             """
-            CREATE TABLE messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                topic TEXT NOT NULL,
-                message TEXT NOT NULL,
-                producer TEXT NOT NULL,
-                timestamp REAL DEFAULT (julianday('now'))
-            )
+            PRAGMA journal_mode=MEMORY;
+            PRAGMA synchronous=OFF;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA cache_size=-20000;
+            PRAGMA locking_mode=EXCLUSIVE;
+            PRAGMA mmap_size=0;
         """
         )
+        conn.executescript(SCHEMA_SQL)
+        yield conn
+        conn.close()
 
-        cursor.execute(
+    @pytest.fixture
+    def in_memory_db(self, shared_db):
+        """Hand each test the shared database, emptied and with ids restarting at 1."""
+        shared_db.rollback()
+        shared_db.executescript(
             """
-            CREATE TABLE subscriptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                consumer TEXT NOT NULL,
-                topic TEXT NOT NULL,
-                timestamp REAL DEFAULT (julianday('now')),
-                UNIQUE(consumer, topic)
-            )
+            DELETE FROM consumptions;
+            DELETE FROM subscriptions;
+            DELETE FROM messages;
         """
         )
+        return shared_db
 
-        cursor.execute(
-            """
-            CREATE TABLE consumptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                consumer TEXT NOT NULL,
-                message_id INTEGER NOT NULL,
-                consumed_at REAL DEFAULT (julianday('now')),
-                FOREIGN KEY (message_id) REFERENCES messages (id),
-                UNIQUE(consumer, message_id)
+    @pytest.mark.parametrize(
+        "topic,message,producer,consumers",
+        [
+            ("test_topic", "test_message", "test_producer", []),
+            ("shared_topic", "shared_message", "shared_producer", ["alice", "bob", "charlie"]),
+            ("sports", "Game started", "sports_producer", []),
+            ("news", "Breaking news", "news_producer", []),
+            ("tech", "New release", "tech_producer", []),
+            ("finance", "Market update", "finance_producer", []),
+        ],
+    )
+    def test_message_round_trip(self, in_memory_db, topic, message, producer, consumers):
+        """Test storing a message, reading it back and recording its consumers."""
+        with in_memory_db:
+            in_memory_db.execute("BEGIN")
+            message_id = in_memory_db.execute(
+                SQL_INSERT_MESSAGE, (topic, message, producer)
+            ).lastrowid
+            in_memory_db.executemany(
+                SQL_INSERT_CONSUMPTION, [(consumer, message_id) for consumer in consumers]
             )
-        """
-        )
 
-        conn.commit()
-        yield conn
-        conn.close()
-
-    def test_message_storage(self, in_memory_db):
-        """Test storing messages in the database."""
-        cursor = in_memory_db.cursor()
-
-        # Store a message
-        cursor.execute(
-            "INSERT INTO messages (topic, message, producer) VALUES (?, ?, ?)",
-            ("test_topic", "test_message", "test_producer"),
-        )
-        in_memory_db.commit()
-
-        # Retrieve the message
-        cursor.execute(
-            "SELECT topic, message, producer FROM messages WHERE topic = ?", ("test_topic",)
-        )
-        result = cursor.fetchone()
+        row = in_memory_db.execute(SQL_SELECT_TOPIC_MESSAGES, (topic,)).fetchone()
+        assert row == (topic, message, producer)
 
-        assert result is not None
-        assert result[0] == "test_topic"
-        assert result[1] == "test_message"
-        assert result[2] == "test_producer"
+        count = in_memory_db.execute(
+            "SELECT COUNT(DISTINCT consumer) FROM consumptions WHERE message_id = ?", (message_id,)
+        ).fetchone()[0]
+        assert count == len(consumers)
 
     def test_subscription_management(self, in_memory_db):
         """Test subscription management."""
-        cursor = in_memory_db.cursor()
-
         # Add subscription
-        cursor.execute(
-            "INSERT OR IGNORE INTO subscriptions (consumer, topic) VALUES (?, ?)",
-            ("alice", "sports"),
-        )
-        cursor.execute(
-            "INSERT OR IGNORE INTO subscriptions (consumer, topic) VALUES (?, ?)", ("alice", "news")
-        )
-        in_memory_db.commit()
+        with in_memory_db:
+            in_memory_db.execute("BEGIN")
+            in_memory_db.execute(SQL_INSERT_SUBSCRIPTION, ("alice", "sports"))
+            in_memory_db.execute(SQL_INSERT_SUBSCRIPTION, ("alice", "news"))
 
         # Check subscriptions
-        cursor.execute("SELECT topic FROM subscriptions WHERE consumer = ?", ("alice",))
-        topics = [row[0] for row in cursor.fetchall()]
+        topics = {row[0] for row in in_memory_db.execute(SQL_SELECT_CONSUMER_TOPICS, ("alice",))}
 
-        assert "sports" in topics
-        assert "news" in topics
-        assert len(topics) == 2
+        assert topics == {"news", "sports"}
 
     def test_consumption_tracking(self, in_memory_db):
         """Test consumption tracking."""
-        cursor = in_memory_db.cursor()
-
         # Store a message
-        cursor.execute(
-            "INSERT INTO messages (topic, message, producer) VALUES (?, ?, ?)",
-            ("test", "message1", "producer1"),
-        )
-        message_id = cursor.lastrowid
-        in_memory_db.commit()
+        message_id = in_memory_db.execute(
+            SQL_INSERT_MESSAGE, ("test", "message1", "producer1")
+        ).lastrowid
 
         # Record consumption
-        cursor.execute(
-            "INSERT OR IGNORE INTO consumptions (consumer, message_id) VALUES (?, ?)",
-            ("bob", message_id),
-        )
-        in_memory_db.commit()
+        in_memory_db.execute(SQL_INSERT_CONSUMPTION, ("bob", message_id))
 
         # Verify consumption
-        cursor.execute(
+        result = in_memory_db.execute(
             "SELECT * FROM consumptions WHERE consumer = ? AND message_id = ?", ("bob", message_id)
-        )
-        result = cursor.fetchone()
+        ).fetchone()
 
         assert result is not None
         assert result[1] == "bob"
@@ -131,8 +142,6 @@ class TestMessageHandling:
 
     def test_message_ordering(self, in_memory_db):
         """Test that messages are retrieved in correct order."""
-        cursor = in_memory_db.cursor()
-
         # Store messages with specific order
         messages = [
             ("order_test", "First", "producer1"),
@@ -140,62 +149,20 @@ class TestMessageHandling:
             ("order_test", "Third", "producer3"),
         ]
 
-        message_ids = []
-        for topic, message, producer in messages:
-            cursor.execute(
-                "INSERT INTO messages (topic, message, producer) VALUES (?, ?, ?)",
-                (topic, message, producer),
-            )
-            message_ids.append(cursor.lastrowid)
-
-        in_memory_db.commit()
+        with in_memory_db:  # One transaction, committed on exit
+            in_memory_db.execute("BEGIN")
+            in_memory_db.executemany(SQL_INSERT_MESSAGE, messages)
 
         # Retrieve messages
-        cursor.execute(
+        results = in_memory_db.execute(
             "SELECT id, message FROM messages WHERE topic = ? ORDER BY id", ("order_test",)
-        )
-        results = cursor.fetchall()
-
-        assert len(results) == 3
-        assert results[0][0] == message_ids[0]
-        assert results[0][1] == "First"
-        assert results[1][0] == message_ids[1]
-        assert results[1][1] == "Second"
-        assert results[2][0] == message_ids[2]
-        assert results[2][1] == "Third"
-
-    def test_multiple_consumers_same_message(self, in_memory_db):
-        """Test multiple consumers consuming the same message."""
-        cursor = in_memory_db.cursor()
+        ).fetchall()
 
-        # Store a message
-        cursor.execute(
-            "INSERT INTO messages (topic, message, producer) VALUES (?, ?, ?)",
-            ("shared_topic", "shared_message", "shared_producer"),
-        )
-        message_id = cursor.lastrowid
-        in_memory_db.commit()
-
-        # Multiple consumers consume it
-        consumers = ["alice", "bob", "charlie"]
-        for consumer in consumers:
-            cursor.execute(
-                "INSERT OR IGNORE INTO consumptions (consumer, message_id) VALUES (?, ?)",
-                (consumer, message_id),
-            )
-        in_memory_db.commit()
-
-        # Check all consumptions were recorded
-        cursor.execute(
-            "SELECT COUNT(DISTINCT consumer) FROM consumptions WHERE message_id = ?", (message_id,)
-        )
-        count = cursor.fetchone()[0]
-        assert count == 3
+        assert [row[1] for row in results] == ["First", "Second", "Third"]
+        assert results[0][0] < results[1][0] < results[2][0]
 
     def test_topic_filtering(self, in_memory_db):
         """Test filtering messages by topic."""
-        cursor = in_memory_db.cursor()
-
         # Store messages in different topics
         topics_messages = [
             ("sports", "Goal scored!", "sports_bot"),
@@ -205,26 +172,18 @@ class TestMessageHandling:
             ("sports", "Player transferred", "sports_bot"),
         ]
 
-        for topic, message, producer in topics_messages:
-            cursor.execute(
-                "INSERT INTO messages (topic, message, producer) VALUES (?, ?, ?)",
-                (topic, message, producer),
-            )
-        in_memory_db.commit()
+        with in_memory_db:
+            in_memory_db.execute("BEGIN")
+            in_memory_db.executemany(SQL_INSERT_MESSAGE, topics_messages)
 
         # Get only sports messages
-        cursor.execute("SELECT message FROM messages WHERE topic = ?", ("sports",))
-        sports_messages = [row[0] for row in cursor.fetchall()]
+        rows = in_memory_db.execute("SELECT message FROM messages WHERE topic = ?", ("sports",))
+        sports_messages = {row[0] for row in rows}
 
-        assert len(sports_messages) == 3
-        assert "Goal scored!" in sports_messages
-        assert "Match ended" in sports_messages
-        assert "Player transferred" in sports_messages
+        assert sports_messages == {"Goal scored!", "Match ended", "Player transferred"}
 
     def test_consumer_subscription_patterns(self, in_memory_db):
         """Test different consumer subscription patterns."""
-        cursor = in_memory_db.cursor()
-
         # Create subscription patterns
         subscriptions = [
             ("alice", "sports"),
@@ -235,79 +194,43 @@ class TestMessageHandling:
             ("charlie", "news"),
         ]
 
-        for consumer, topic in subscriptions:
-            cursor.execute(
-                "INSERT OR IGNORE INTO subscriptions (consumer, topic) VALUES (?, ?)",
-                (consumer, topic),
-            )
-        in_memory_db.commit()
+        with in_memory_db:
+            in_memory_db.execute("BEGIN")
+            in_memory_db.executemany(SQL_INSERT_SUBSCRIPTION, subscriptions)
 
         # Test subscription queries
-        cursor.execute("SELECT topic FROM subscriptions WHERE consumer = ?", ("alice",))
-        alice_topics = [row[0] for row in cursor.fetchall()]
-
-        cursor.execute("SELECT topic FROM subscriptions WHERE consumer = ?", ("charlie",))
-        charlie_topics = [row[0] for row in cursor.fetchall()]
-
-        assert len(alice_topics) == 2
-        assert "sports" in alice_topics
-        assert "news" in alice_topics
+        alice_topics = {
+            row[0] for row in in_memory_db.execute(SQL_SELECT_CONSUMER_TOPICS, ("alice",))
+        }
+        charlie_topics = {
+            row[0] for row in in_memory_db.execute(SQL_SELECT_CONSUMER_TOPICS, ("charlie",))
+        }
 
-        assert len(charlie_topics) == 3
-        assert "sports" in charlie_topics
-        assert "tech" in charlie_topics
-        assert "news" in charlie_topics
-
-    @pytest.mark.parametrize(
-        "topic,message",
-        [
-            ("sports", "Game started"),
-            ("news", "Breaking news"),
-            ("tech", "New release"),
-            ("finance", "Market update"),
-        ],
-    )
-    def test_message_creation_patterns(self, in_memory_db, topic, message):
-        """Test message creation for different patterns."""
-        cursor = in_memory_db.cursor()
-
-        cursor.execute(
-            "INSERT INTO messages (topic, message, producer) VALUES (?, ?, ?)",
-            (topic, message, f"{topic}_producer"),
-        )
-        in_memory_db.commit()
-
-        # Retrieve and verify
-        cursor.execute("SELECT topic, message, producer FROM messages WHERE topic = ?", (topic,))
-        result = cursor.fetchone()
-
-        assert result[0] == topic
-        assert result[1] == message
-        assert result[2] == f"{topic}_producer"
+        assert alice_topics == {"news", "sports"}
+        assert charlie_topics == {"news", "sports", "tech"}
 
     def test_message_statistics(self, in_memory_db):
         """Test message statistics and counts."""
-        cursor = in_memory_db.cursor()
-
         # Create messages across multiple topics
         test_data = [("sports", 5), ("news", 3), ("tech", 7), ("finance", 2)]
 
-        for topic, count in test_data:
-            for i in range(count):
-                cursor.execute(
-                    "INSERT INTO messages (topic, message, producer) VALUES (?, ?, ?)",
-                    (topic, f"Message {i}", f"{topic}_bot"),
-                )
-        in_memory_db.commit()
+        rows = [(topic, f"Message {i}", f"{topic}_bot") for topic, count in test_data
+                for i in range(count)]
+        # One multi-row INSERT (17 rows, far below SQLite's bound-variable limit)
+        values = ", ".join(["(?, ?, ?)"] * len(rows))
+        in_memory_db.execute(
+            f"INSERT INTO messages (topic, message, producer) VALUES {values}",
+            [value for row in rows for value in row],
+        )
 
         # Test statistics
-        cursor.execute("SELECT COUNT(*) FROM messages")
-        total_messages = cursor.fetchone()[0]
+        total_messages = in_memory_db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
         assert total_messages == sum(count for _, count in test_data)
 
         # Test per-topic statistics
-        cursor.execute("SELECT topic, COUNT(*) FROM messages GROUP BY topic ORDER BY topic")
-        topic_counts = cursor.fetchall()
+        topic_counts = in_memory_db.execute(
+            "SELECT topic, COUNT(*) FROM messages GROUP BY topic ORDER BY topic"
+        ).fetchall()
 
         expected = dict(test_data)
         for topic, count in topic_counts:
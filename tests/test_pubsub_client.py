@@ -1,3 +1,4 @@
+import json
 import logging
 import sys
 from pathlib import Path
@@ -5,7 +6,7 @@ from pathlib import Path
 # Add src to path - needs to be before local imports
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
-from unittest.mock import MagicMock, patch  # noqa: E402
+from unittest.mock import ANY, Mock, patch  # noqa: E402
 
 import pytest  # noqa: E402
 from socketio import exceptions  # noqa: E402
@@ -13,118 +14,151 @@ from socketio import exceptions  # noqa: E402
 from client import BASE_URL, PubSubClient  # noqa: E402
 
 
-# Mock of socketio.Client
-# We will mock the socketio.Client class itself, not its instance directly
-# Then, we access mock_sio_client.return_value to mock the instance methods
-@pytest.fixture
+class FakeSioClient:
+    """Stand-in for socketio.Client that records what PubSubClient does with it."""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.connected = False  # Simulate initial disconnected state
+        self.connect_error = None  # Exception raised by connect(), if any
+        self.handlers = {}
+        self.connects = []
+        self.emits = []
+        self.disconnects = 0
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    def connect(self, url):
+        self.connects.append(url)
+        if self.connect_error is not None:
+            raise self.connect_error
+
+    def emit(self, event, data):
+        self.emits.append((event, data))
+
+    def disconnect(self):
+        self.disconnects += 1
+
+
+@pytest.fixture(scope="module", autouse=True)
 def mock_sio_client():
-    """Mocks the socketio.Client instance used by PubSubClient."""
-    with patch(
-            "client.socketio.Client"
-    ) as MockClient:  # <-- Patch la class directement dans le module client
-        instance = MockClient.return_value  # This is the mock of the instance that will be created
-        instance.connected = False  # Simulate initial disconnected state
-        yield MockClient  # We yield the Mock of the Client CLASS itself, not its instance
+    """Replaces the socketio.Client class used by PubSubClient with FakeSioClient.
+
+    Patched once for the module: every PubSubClient gets a fresh FakeSioClient, so
+    there is no recorded state to reset between tests.
+    """
+    with patch("client.socketio.Client", FakeSioClient):
+        yield FakeSioClient
 
 
-# Mock de requests.post
+# Mock of the pooled HTTP session's post
 @pytest.fixture
 def mock_requests_post():
-    """Mocke requests.post pour les appels de publication HTTP."""
-    # Patch requests.post in the client module where it is used
+    """Mocks Session.post for HTTP publish calls."""
+    # Patch post on the Session class used by the client module
     with patch(
-            "client.requests.post"
-    ) as mock_post:  # <-- Patch requests.post dans le module client
-        mock_response = MagicMock()
-        mock_response.json.return_value = {"status": "ok", "message_id": "test_id_returned"}
+            "client.requests.Session.post"
+    ) as mock_post:
+        mock_response = Mock()
+        mock_response.content = b'{"status": "ok", "message_id": "test_id_returned"}'
         mock_response.raise_for_status.return_value = None  # No HTTP errors by default
         mock_post.return_value = mock_response
         yield mock_post
 
 
+@pytest.fixture
+def client_factory(mock_sio_client):
+    """Builds PubSubClient instances on top of the mocked socketio.Client."""
+    return PubSubClient
+
+
+@pytest.fixture
+def client(client_factory):
+    """A PubSubClient for tests that do not care about its consumer name or topics."""
+    return client_factory("test_user", ["t1", "t2"])
+
+
+@pytest.fixture(autouse=True)
+def _capture_info_logs(caplog):
+    """Captures INFO logs for every test instead of wrapping each call in caplog.at_level."""
+    caplog.set_level(logging.INFO)
+
+
 # --- Tests pour la class PubSubClient (du fichier client.py) ---
 
 
-def test_pubsub_client_init(mock_sio_client):
+def test_pubsub_client_init(client_factory):
     """Verifies client initialization and handler registration."""
     consumer = "test_alice"
     topics = ["sport", "finance"]
-    client = PubSubClient(consumer, topics)
+    client = client_factory(consumer, topics)
 
     assert client.consumer_name == consumer
     assert client.topics == topics
 
-    # Verify that socketio.Client was called once with the correct argument
-    mock_sio_client.assert_called_once_with(reconnection=True)
-
-    # Verify that event handlers are registered on the mocked instance
-    mock_sio_client.return_value.on.assert_any_call("message", client.on_message)
-    mock_sio_client.return_value.on.assert_any_call("new_client", client.on_new_client)
-    mock_sio_client.return_value.on.assert_any_call(
-        "client_disconnected", client.on_client_disconnected
-    )
-    mock_sio_client.return_value.on.assert_any_call("new_consumption", client.on_new_consumption)
-    mock_sio_client.return_value.on.assert_any_call("new_message", client.on_new_message)
+    # Verify that socketio.Client was created with the correct argument
+    assert client.sio.kwargs == {"reconnection": True}
+
+    # Verify that event handlers are registered on the fake instance
+    # (the "<event>_batch" wrappers are covered by test_pubsub_client_handles_event_batches)
+    expected = {
+        "message": client.on_message,
+        "new_client": client.on_new_client,
+        "client_disconnected": client.on_client_disconnected,
+        "new_consumption": client.on_new_consumption,
+        "new_message": client.on_new_message,
+    }
+    assert expected.items() <= client.sio.handlers.items()
 
 
-def test_pubsub_client_connect_success(mock_sio_client):
+def test_pubsub_client_connect_success(client):
     """Tests the connect method in case of success."""
-    consumer = "test_bob"
-    topics = ["tech"]
-    client = PubSubClient(consumer, topics)
-
-    # Get the mock of the client instance that was created
-    mock_instance = mock_sio_client.return_value
-    mock_instance.connected = True  # Simulate successful connection
 
     client.connect()
 
-    # Verify that connect was called on the mocked instance with the correct URL
-    mock_instance.connect.assert_called_once_with(BASE_URL)
+    # Verify that connect was called on the fake instance with the correct URL
+    assert client.sio.connects == [BASE_URL]
 
-    # Verify that the "subscribe" event was emitted on the mocked instance
-    mock_instance.emit.assert_called_once_with(
-        "subscribe", {"consumer": consumer, "topics": topics}
-    )
+    # Verify that the "subscribe" event was emitted on the fake instance
+    assert client.sio.emits == [("subscribe", {"consumer": "test_user", "topics": ["t1", "t2"]})]
 
 
-def test_pubsub_client_connect_failure(mock_sio_client, caplog):
+def test_pubsub_client_connect_failure(client, caplog):
     """Tests the connect method in case of connection failure."""
-    consumer = "test_charlie"
-    topics = ["music"]
-    client = PubSubClient(consumer, topics)
 
-    # Obtenez le mock de l'instance client
-    mock_instance = mock_sio_client.return_value
     # Simule une ConnectionError lors de la connection
-    mock_instance.connect.side_effect = exceptions.ConnectionError("Connection refused")
+    client.sio.connect_error = exceptions.ConnectionError("Connection refused")
 
-    with caplog.at_level(logging.ERROR):  # Capture les logs d'erreur
-        client.connect()
+    client.connect()
 
     # The error message should be in the logs
     assert "Failed to connect to server: Connection refused" in caplog.text
     # Verify that connect was called even if it raised an exception
-    mock_instance.connect.assert_called_once()
+    assert client.sio.connects == [BASE_URL]
+    assert client.sio.emits == []
 
 
-def test_pubsub_client_on_message(caplog):
+def test_pubsub_client_on_message(client, caplog):
     """Teste le gestionnaire on_message."""
-    consumer = "test_diana"
-    topics = ["food"]
-    client = PubSubClient(consumer, topics)
 
     test_data = {"topic": "pizza", "message": {"type": "text", "content": "Hello pizza!"}}
-    with caplog.at_level(logging.INFO):
-        client.on_message(test_data)
+    client.on_message(test_data)
     assert "[MESSAGE] [pizza] {'type': 'text', 'content': 'Hello pizza!'}" in caplog.text
 
 
-def test_pubsub_client_publish(mock_requests_post):
+def test_pubsub_client_handles_event_batches(client, caplog):
+    """Tests that coalesced monitoring events are logged one by one."""
+    handlers = client.sio.handlers
+
+    handlers["new_consumption_batch"]([{"message_id": "m1"}, {"message_id": "m2"}])
+    assert "[NEW CONSUMPTION] {'message_id': 'm1'}" in caplog.text
+    assert "[NEW CONSUMPTION] {'message_id': 'm2'}" in caplog.text
+    assert {"new_client_batch", "client_disconnected_batch", "new_message_batch"} <= set(handlers)
+
+
+def test_pubsub_client_publish(mock_requests_post, client):
     """Tests the publish method."""
-    consumer = "test_eve"
-    topics = ["travel"]
-    client = PubSubClient(consumer, topics)
 
     topic_to_publish = "destinations"
     message_content = {"city": "Paris", "country": "France"}
@@ -132,51 +166,52 @@ def test_pubsub_client_publish(mock_requests_post):
 
     response = client.publish(topic_to_publish, message_content, message_id)
 
-    # Verify that requests.post was called with the correct data
+    # Verify that the session's post was called with the correct data
     expected_url = f"{BASE_URL}/publish"
     expected_json = {
         "topic": topic_to_publish,
         "message": message_content,
-        "producer": consumer,
+        "producer": "test_user",
         "message_id": message_id,
     }
-    mock_requests_post.assert_called_once_with(expected_url, json=expected_json, timeout=10)
+    mock_requests_post.assert_called_once_with(
+        expected_url, data=ANY, headers={"Content-Type": "application/json"}, timeout=10
+    )
+    assert json.loads(mock_requests_post.call_args.kwargs["data"]) == expected_json
 
     # Verify the response returned by the publish method
     assert response == {"status": "ok", "message_id": "test_id_returned"}
 
 
-def test_pubsub_client_disconnect_connected(mock_sio_client, caplog):
+def test_pubsub_client_publish_reuses_session(mock_requests_post, client):
+    """Tests that publishes go through one pooled HTTP session."""
+
+    client.publish("destinations", "first", "id-1")
+    client.publish("destinations", "second", "id-2")
+
+    assert mock_requests_post.call_count == 2
+    assert client.http.get_adapter(BASE_URL)._pool_maxsize == 32
+
+
+def test_pubsub_client_disconnect_connected(client, caplog):
     """Tests disconnection when the client is connected."""
-    consumer = "test_frank"
-    topics = ["sports"]
-    client = PubSubClient(consumer, topics)
 
-    # Obtenez le mock de l'instance client
-    mock_instance = mock_sio_client.return_value
-    mock_instance.connected = True  # Simulate connected state
+    client.sio.connected = True  # Simulate connected state
 
-    with caplog.at_level(logging.INFO):
-        client.disconnect()
+    client.disconnect()
 
-    # Verify that disconnect was called on the mocked instance
-    mock_instance.disconnect.assert_called_once()
-    assert f"Disconnected {consumer} from server." in caplog.text
+    # Verify that disconnect was called on the fake instance
+    assert client.sio.disconnects == 1
+    assert "Disconnected test_user from server." in caplog.text
 
 
-def test_pubsub_client_disconnect_not_connected(mock_sio_client, caplog):
+def test_pubsub_client_disconnect_not_connected(client, caplog):
     """Tests disconnection when the client is not connected."""
-    consumer = "test_grace"
-    topics = ["art"]
-    client = PubSubClient(consumer, topics)
 
-    # Obtenez le mock de l'instance client
-    mock_instance = mock_sio_client.return_value
-    mock_instance.connected = False  # Simulate disconnected state
+    client.sio.connected = False  # Simulate disconnected state
 
-    with caplog.at_level(logging.INFO):
-        client.disconnect()
+    client.disconnect()
 
-    # Verify that disconnect was NOT called on the mocked instance
-    mock_instance.disconnect.assert_not_called()
-    assert f"Disconnected {consumer} from server." not in caplog.text
+    # Verify that disconnect was NOT called on the fake instance
+    assert client.sio.disconnects == 0
+    assert "Disconnected test_user from server." not in caplog.text
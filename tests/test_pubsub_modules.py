@@ -1,70 +1,73 @@
 """Test the pubsub modules independently."""
 
+import asyncio
+import json
 import sqlite3
 import sys
+import threading
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
+import socketio
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
+from pubsub.pubsub_async_client import AsyncPubSubClient  # noqa: E402
+from pubsub.pubsub_client import PubSubClient  # noqa: E402
+from pubsub.pubsub_json import OrjsonModule, dumps_bytes  # noqa: E402
+from pubsub.pubsub_message import PubSubMessage, new_message_id  # noqa: E402
 
-class TestBroker:
-    """Test the Broker class without Flask/SocketIO dependencies."""
+# Tables used by TestBroker and TestDatabaseOperations, read once at import
+SCHEMA_SQL = (Path(__file__).parent / "schema.sql").read_text()
 
-    @pytest.fixture
-    def in_memory_db(self):
-        """Create an in-memory database."""
-        conn = sqlite3.connect(":memory:")
-        # Initialize the database schema
-        cursor = conn.cursor()
 
-        cursor.execute(
-            """
-            CREATE TABLE messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                topic TEXT NOT NULL,
-                message TEXT NOT NULL,
-                timestamp REAL DEFAULT (CURRENT_TIMESTAMP)
-            )
-        """
-        )
+@pytest.fixture(scope="session")
+def schema_template():
+    """Build the schema once; tests get page-level copies of it through the backup API."""
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(SCHEMA_SQL)
+    yield conn
+    conn.close()
 
-        cursor.execute(
-            """
-            CREATE TABLE subscriptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                consumer TEXT NOT NULL,
-                topic TEXT NOT NULL,
-                timestamp REAL DEFAULT (CURRENT_TIMESTAMP),
-                UNIQUE(consumer, topic)
-            )
-        """
-        )
 
-        cursor.execute(
-            """
-            CREATE TABLE consumptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                consumer TEXT NOT NULL,
-                message_id INTEGER NOT NULL,
-                consumed_at REAL DEFAULT (CURRENT_TIMESTAMP),
-                FOREIGN KEY (message_id) REFERENCES messages (id),
-                UNIQUE(consumer, message_id)
-            )
+@pytest.fixture
+def schema_db(schema_template):
+    """A fresh in-memory database cloned from the schema template."""
+    conn = sqlite3.connect(":memory:", cached_statements=256)
+    schema_template.backup(conn)
+    # Nothing here needs durability: no journal file, no syncs, one exclusive lock
+    conn.executescript(
         """
-        )
+        PRAGMA journal_mode=MEMORY;
+        PRAGMA synchronous=OFF;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-20000;
+        PRAGMA locking_mode=EXCLUSIVE;
+        PRAGMA mmap_size=0;
+    """
+    )
+    yield conn
+    conn.close()
 
-        conn.commit()
-        yield conn
-        conn.close()
 
-    def test_message_storage(self, in_memory_db):
-        """Test storing messages in the database."""
-        cursor = in_memory_db.cursor()
+@pytest.fixture
+def cursor(schema_db):
+    """The cursor a database test issues all of its statements through."""
+    return schema_db.cursor()
+
 
+class TestBroker:
+    """Test the Broker class without Flask/SocketIO dependencies."""
+
+    @pytest.fixture
+    def in_memory_db(self, schema_db):
+        """Create an in-memory database."""
+        return schema_db
+
+    def test_message_storage(self, in_memory_db, cursor):
+        """Test storing messages in the database."""
         # Store a message
         cursor.execute(
             "INSERT INTO messages (topic, message) VALUES (?, ?)", ("test_topic", "test_message")
@@ -79,19 +82,14 @@ class TestBroker:
         assert result[0] == "test_topic"
         assert result[1] == "test_message"
 
-    def test_subscription_management(self, in_memory_db):
+    def test_subscription_management(self, in_memory_db, cursor):
         """Test subscription management."""
-        cursor = in_memory_db.cursor()
-
-        # Add subscription
-        cursor.execute(
-            "INSERT OR IGNORE INTO subscriptions (consumer, topic) VALUES (?, ?)",
-            ("alice", "sports"),
-        )
-        cursor.execute(
-            "INSERT OR IGNORE INTO subscriptions (consumer, topic) VALUES (?, ?)", ("alice", "news")
-        )
-        in_memory_db.commit()
+        # Add subscriptions in one transaction
+        with in_memory_db:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO subscriptions (consumer, topic) VALUES (?, ?)",
+                [("alice", "sports"), ("alice", "news")],
+            )
 
         # Check subscriptions
         cursor.execute("SELECT topic FROM subscriptions WHERE consumer = ?", ("alice",))
@@ -101,10 +99,8 @@ class TestBroker:
         assert "news" in topics
         assert len(topics) == 2
 
-    def test_consumption_tracking(self, in_memory_db):
+    def test_consumption_tracking(self, in_memory_db, cursor):
         """Test consumption tracking."""
-        cursor = in_memory_db.cursor()
-
         # Store a message
         cursor.execute("INSERT INTO messages (topic, message) VALUES (?, ?)", ("test", "message1"))
         message_id = cursor.lastrowid
@@ -127,10 +123,8 @@ class TestBroker:
         assert result[1] == "bob"
         assert result[2] == message_id
 
-    def test_multiple_consumers_same_message(self, in_memory_db):
+    def test_multiple_consumers_same_message(self, in_memory_db, cursor):
         """Test multiple consumers consuming the same message."""
-        cursor = in_memory_db.cursor()
-
         # Store a message
         cursor.execute(
             "INSERT INTO messages (topic, message) VALUES (?, ?)", ("shared", "shared_message")
@@ -138,14 +132,13 @@ class TestBroker:
         message_id = cursor.lastrowid
         in_memory_db.commit()
 
-        # Multiple consumers consume it
+        # Multiple consumers consume it, recorded in one transaction
         consumers = ["alice", "bob", "charlie"]
-        for consumer in consumers:
-            cursor.execute(
+        with in_memory_db:
+            cursor.executemany(
                 "INSERT OR IGNORE INTO consumptions (consumer, message_id) VALUES (?, ?)",
-                (consumer, message_id),
+                [(consumer, message_id) for consumer in consumers],
             )
-        in_memory_db.commit()
 
         # Verify all consumptions
         cursor.execute(
@@ -154,28 +147,27 @@ class TestBroker:
         count = cursor.fetchone()[0]
         assert count == 3
 
-    @pytest.mark.parametrize(
-        "topic,message",
-        [
+    def test_various_topics(self, in_memory_db):
+        """Test storing messages for various topics."""
+        rows = [
             ("sports", "Game started"),
             ("news", "Breaking news"),
             ("tech", "New release"),
             ("weather", "Sunny day"),
-        ],
-    )
-    def test_various_topics(self, in_memory_db, topic, message):
-        """Test storing messages for various topics."""
-        cursor = in_memory_db.cursor()
-
-        cursor.execute("INSERT INTO messages (topic, message) VALUES (?, ?)", (topic, message))
-        in_memory_db.commit()
+        ]
+
+        # One multi-row INSERT instead of one test run per topic
+        values = ", ".join(["(?, ?)"] * len(rows))
+        with in_memory_db:
+            in_memory_db.execute(
+                f"INSERT INTO messages (topic, message) VALUES {values}",
+                [value for row in rows for value in row],
+            )
 
         # Retrieve and verify
-        cursor.execute("SELECT topic, message FROM messages WHERE topic = ?", (topic,))
-        result = cursor.fetchone()
+        result = in_memory_db.execute("SELECT topic, message FROM messages ORDER BY id").fetchall()
 
-        assert result[0] == topic
-        assert result[1] == message
+        assert result == rows
 
 
 class TestPubSubMessage:
@@ -183,40 +175,77 @@ class TestPubSubMessage:
 
     def test_message_creation(self):
         """Test creating a message object."""
-        # Import here to avoid SocketIO initialization issues
-        with patch.dict("sys.modules", {"pubsub_ws": MagicMock()}):
-            from pubsub.pubsub_message import PubSubMessage
-
-            msg = PubSubMessage(
-                topic="test_topic",
-                message_id="12345",
-                message="test_content",
-                producer="test_producer",
-            )
+        msg = PubSubMessage(
+            topic="test_topic",
+            message_id="12345",
+            message="test_content",
+            producer="test_producer",
+        )
 
-            assert msg.topic == "test_topic"
-            assert msg.message == "test_content"
-            assert msg.producer == "test_producer"
-            assert msg.message_id == "12345"
+        assert msg.topic == "test_topic"
+        assert msg.message == "test_content"
+        assert msg.producer == "test_producer"
+        assert msg.message_id == "12345"
 
     def test_message_serialization(self):
         """Test message serialization to dict."""
-        with patch.dict("sys.modules", {"pubsub_ws": MagicMock()}):
-            from pubsub.pubsub_message import PubSubMessage
-
-            msg = PubSubMessage(
-                topic="sports",
-                message_id="msg123",
-                message="Goal scored!",
-                producer="sports_reporter",
-            )
+        msg = PubSubMessage(
+            topic="sports",
+            message_id="msg123",
+            message="Goal scored!",
+            producer="sports_reporter",
+        )
+
+        msg_dict = msg.to_dict()
+
+        assert msg_dict["topic"] == "sports"
+        assert msg_dict["message"] == "Goal scored!"
+        assert msg_dict["producer"] == "sports_reporter"
+        assert msg_dict["message_id"] == "msg123"
+
+
+    def test_new_dict_matches_to_dict(self):
+        """Test that the instance-free builder produces the same payload as to_dict."""
+        msg = PubSubMessage.new("sports", {"score": "1-0"}, "reporter", "msg123")
+        payload = PubSubMessage.new_dict("sports", {"score": "1-0"}, "reporter", "msg123")
+
+        assert payload == msg.to_dict()
+        assert PubSubMessage.new_dict("sports", "hi", "reporter")["message_id"]
+
+    def test_to_bytes_matches_to_dict(self):
+        """Test that direct serialization produces the to_dict payload."""
+        msg = PubSubMessage.new("sports", {"score": "1-0"}, "reporter", "msg123")
+
+        assert json.loads(msg.to_bytes()) == msg.to_dict()
+
+    def test_message_has_no_instance_dict(self):
+        """Test that messages use slots instead of a per-instance __dict__."""
+        msg = PubSubMessage.new("sports", "hi", "reporter", "msg123")
 
-            msg_dict = msg.to_dict()
+        assert not hasattr(msg, "__dict__")
+        with pytest.raises(AttributeError):
+            msg.extra = 1
 
-            assert msg_dict["topic"] == "sports"
-            assert msg_dict["message"] == "Goal scored!"
-            assert msg_dict["producer"] == "sports_reporter"
-            assert msg_dict["message_id"] == "msg123"
+    def test_generated_message_ids_are_unique_hex(self):
+        """Test that generated message IDs are 32 hex characters and unique."""
+        ids = {new_message_id() for _ in range(100)}
+        assert len(ids) == 100
+        for message_id in ids:
+            assert len(message_id) == 32
+            int(message_id, 16)
+
+        assert len(PubSubMessage.new("sports", "hi", "reporter").message_id) == 32
+
+    def test_orjson_module_round_trip(self):
+        """Test the orjson-backed json module used for Socket.IO packets."""
+        data = {"topic": "sports", "message": {"score": [1, 0]}, 1: "non-str key"}
+        encoded = OrjsonModule.dumps(data, separators=(",", ":"))
+
+        assert isinstance(encoded, str)
+        assert OrjsonModule.loads(encoded) == {
+            "topic": "sports", "message": {"score": [1, 0]}, "1": "non-str key"
+        }
+        assert json.loads(dumps_bytes({"a": 1})) == {"a": 1}
 
 
 class TestPubSubClient:
@@ -225,13 +254,11 @@ class TestPubSubClient:
     @pytest.fixture
     def mock_websocket(self):
         """Mock websocket connection."""
-        return MagicMock()
+        return Mock()
 
     def test_client_creation(self, mock_websocket):
         """Test creating a PubSubClient."""
-        with patch("socketio.Client"):
-            from pubsub.pubsub_client import PubSubClient
-
+        with patch("socketio.Client", Mock(spec=socketio.Client)):
             client = PubSubClient(
                 url="http://localhost:5000", consumer="test_consumer", topics=["test_topic"]
             )
@@ -242,9 +269,7 @@ class TestPubSubClient:
 
     def test_subscription_management(self, mock_websocket):
         """Test subscription management."""
-        with patch("socketio.Client"):
-            from pubsub.pubsub_client import PubSubClient
-
+        with patch("socketio.Client", Mock(spec=socketio.Client)):
             topics = ["sports", "news", "tech"]
             client = PubSubClient(
                 url="http://localhost:5000", consumer="test_consumer", topics=topics
@@ -256,52 +281,274 @@ class TestPubSubClient:
             assert "news" in client.topics
             assert "tech" in client.topics
 
+    def test_websocket_socket_options(self, mock_websocket):
+        """Test that the websocket is configured with TCP_NODELAY and large buffers."""
+        import socket
 
-class TestDatabaseOperations:
-    """Test database operations in isolation."""
+        with patch("socketio.Client", Mock(spec=socketio.Client)) as mock_client:
+            PubSubClient(url="http://localhost:5000", consumer="test_consumer", topics=["t"])
 
-    def test_database_schema(self):
-        """Test that the database schema is correct."""
-        conn = sqlite3.connect(":memory:")
-        cursor = conn.cursor()
+            sockopt = mock_client.call_args.kwargs["websocket_extra_options"]["sockopt"]
+            assert (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) in sockopt
+            assert (socket.SOL_SOCKET, socket.SO_SNDBUF, 4 << 20) in sockopt
+            assert (socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20) in sockopt
 
-        # Create tables
-        cursor.execute(
-            """
-            CREATE TABLE messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                topic TEXT NOT NULL,
-                message TEXT NOT NULL,
-                timestamp REAL DEFAULT (CURRENT_TIMESTAMP)
+    def test_publish_reuses_session(self, mock_websocket):
+        """Test that publish goes through the pooled HTTP session."""
+        with patch("socketio.Client", Mock(spec=socketio.Client)):
+            client = PubSubClient(
+                url="http://localhost:5000/", consumer="test_consumer", topics=["test_topic"]
             )
-        """
-        )
 
-        cursor.execute(
-            """
-            CREATE TABLE subscriptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                consumer TEXT NOT NULL,
-                topic TEXT NOT NULL,
-                timestamp REAL DEFAULT (CURRENT_TIMESTAMP),
-                UNIQUE(consumer, topic)
+            with patch.object(client._session, "post") as mock_post:
+                client.publish("test_topic", "hello", "producer", "id-1")
+                client.publish("test_topic", "world", "producer", "id-2")
+
+            assert mock_post.call_count == 2
+            for call in mock_post.call_args_list:
+                assert call.args[0] == "http://localhost:5000/publish"
+                assert call.kwargs["headers"]["Content-Type"] == "application/json"
+            assert json.loads(mock_post.call_args.kwargs["data"]) == {
+                "topic": "test_topic",
+                "message_id": "id-2",
+                "message": "world",
+                "producer": "producer",
+            }
+
+            client.close()
+
+
+    def test_publish_applies_environment_settings(self, mock_websocket, monkeypatch):
+        """Test that publishes pick up proxy settings from the environment."""
+        monkeypatch.setenv("HTTP_PROXY", "http://proxy.local:3128")
+        monkeypatch.delenv("NO_PROXY", raising=False)
+        monkeypatch.delenv("no_proxy", raising=False)
+        with patch("socketio.Client", Mock(spec=socketio.Client)):
+            client = PubSubClient(
+                url="http://localhost:5000", consumer="test_consumer", topics=["test_topic"]
             )
-        """
-        )
 
-        cursor.execute(
-            """
-            CREATE TABLE consumptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                consumer TEXT NOT NULL,
-                message_id INTEGER NOT NULL,
-                consumed_at REAL DEFAULT (CURRENT_TIMESTAMP),
-                FOREIGN KEY (message_id) REFERENCES messages (id),
-                UNIQUE(consumer, message_id)
+            with patch.object(client._session, "send") as mock_send:
+                client.publish("test_topic", "hello", "producer", "id-1")
+
+            assert mock_send.call_args.kwargs["proxies"]["http"] == "http://proxy.local:3128"
+
+            client.close()
+
+    def test_publish_recycles_payload_dicts(self, mock_websocket, caplog):
+        """Test that serialized payload dicts are cleared and returned to the pool."""
+        caplog.set_level("INFO")
+        with patch("socketio.Client", Mock(spec=socketio.Client)):
+            client = PubSubClient(
+                url="http://localhost:5000", consumer="test_consumer", topics=["test_topic"]
             )
-        """
+            pool_size = len(client._dict_pool)
+            pooled = client._dict_pool[-1]
+
+            with patch.object(client._session, "post") as mock_post:
+                client.publish("test_topic", "hello", "producer", "id-1")
+
+            assert json.loads(mock_post.call_args.kwargs["data"])["message"] == "hello"
+            assert len(client._dict_pool) == pool_size
+            assert client._dict_pool[-1] is pooled
+            assert pooled == {}
+            # Log records formatted after the release still show the published payload
+            [record] = [r for r in caplog.records if r.msg.startswith("[%s] Publishing to")]
+            assert "'message': 'hello'" in record.getMessage()
+
+            client.close()
+
+    def test_publisher_binds_producer(self, mock_websocket):
+        """Test that a producer-specialized publisher stamps its producer on every message."""
+        with patch("socketio.Client", Mock(spec=socketio.Client)):
+            client = PubSubClient(
+                url="http://localhost:5000", consumer="test_consumer", topics=["test_topic"]
+            )
+            publish = client.publisher("reporter")
+
+            with patch.object(client._session, "post") as mock_post:
+                publish("test_topic", "hello", "id-1")
+                publish("test_topic", "world")
+
+            bodies = [json.loads(call.kwargs["data"]) for call in mock_post.call_args_list]
+            assert [body["producer"] for body in bodies] == ["reporter", "reporter"]
+            assert bodies[0]["message_id"] == "id-1"
+            assert len(bodies[1]["message_id"]) == 32
+
+            client.close()
+
+    def test_batched_publish_flushes_to_batch_endpoint(self, mock_websocket):
+        """Test that batched publishes are sent together to /publish_batch."""
+        with patch("socketio.Client", Mock(spec=socketio.Client)):
+            client = PubSubClient(
+                url="http://localhost:5000",
+                consumer="test_consumer",
+                topics=["test_topic"],
+                batch_size=3,
+                write_delay_ms=10_000,
+            )
+
+            with patch.object(client._session, "post") as mock_post:
+                for i in range(3):
+                    client.publish("test_topic", f"message {i}", "producer", f"id-{i}")
+                client.close()
+
+            mock_post.assert_called_once()
+            assert mock_post.call_args.args[0] == "http://localhost:5000/publish_batch"
+            batch = json.loads(mock_post.call_args.kwargs["data"])
+            assert [m["message_id"] for m in batch] == ["id-0", "id-1", "id-2"]
+
+    def test_process_queue_dispatches_to_handler(self, mock_websocket):
+        """Test that queued messages are routed to the handler registered for their topic."""
+        with patch("socketio.Client", Mock(spec=socketio.Client)):
+            client = PubSubClient(
+                url="http://localhost:5000", consumer="test_consumer", topics=["sports"]
+            )
+            received = []
+
+            def handler(message):
+                received.append(message)
+                client.running = False
+
+            client.register_handler("sports", handler)
+            client.on_message(
+                {"topic": "sports", "message_id": "m1", "message": "Goal!", "producer": "bot"}
+            )
+            client.running = True
+            client.process_queue()
+
+            assert received == ["Goal!"]
+            client.sio.emit.assert_called_once_with(
+                "consumed",
+                {"consumer": "test_consumer", "topic": "sports", "message_id": "m1",
+                 "message": "Goal!"},
+            )
+
+    def test_message_batch_queues_each_message(self, mock_websocket):
+        """Test that a message_batch event queues its messages in order."""
+        with patch("socketio.Client", Mock(spec=socketio.Client)):
+            client = PubSubClient(
+                url="http://localhost:5000", consumer="test_consumer", topics=["a", "b"]
+            )
+            client.sio.on.assert_any_call("message_batch", client.on_message_batch)
+
+            client.on_message_batch([
+                {"topic": "a", "message_id": "c1", "message": "Subscribed to a"},
+                {"topic": "b", "message_id": "c1", "message": "Subscribed to b"},
+            ])
+
+            assert [client.message_queue.get_nowait()["topic"] for _ in range(2)] == ["a", "b"]
+
+    def test_handler_workers_run_handlers_concurrently(self, mock_websocket):
+        """Test that a slow handler does not hold back later messages when workers are set."""
+        with patch("socketio.Client", Mock(spec=socketio.Client)):
+            client = PubSubClient(
+                url="http://localhost:5000", consumer="test_consumer", topics=["slow", "fast"],
+                handler_workers=2,
+            )
+            fast_done = threading.Event()
+            handled = []
+
+            def slow_handler(message):
+                fast_done.wait(5)
+                handled.append(message)
+
+            def fast_handler(message):
+                handled.append(message)
+                fast_done.set()
+
+            client.register_handler("slow", slow_handler)
+            client.register_handler("fast", fast_handler)
+            client.on_message({"topic": "slow", "message_id": "m1", "message": "1"})
+            client.on_message({"topic": "fast", "message_id": "m2", "message": "2"})
+
+            client.running = True
+            worker = threading.Thread(target=client.process_queue, daemon=True)
+            worker.start()
+            client.message_queue.join()
+            client.running = False
+            worker.join()
+            client.close()
+
+            assert handled == ["2", "1"]
+            assert client.sio.emit.call_count == 2
+
+    def test_dispatch_uses_current_handlers(self, mock_websocket, caplog):
+        """Test that handlers added later are picked up and failures are contained."""
+        with patch("socketio.Client", Mock(spec=socketio.Client)):
+            client = PubSubClient(
+                url="http://localhost:5000", consumer="test_consumer", topics=["a", "b"]
+            )
+            received = []
+
+            client._dispatch("a", "dropped")
+            client.register_handler("a", received.append)
+            client._dispatch("a", "first")
+
+            def failing_handler(message):
+                raise ValueError("boom")
+
+            client.register_handler("b", failing_handler)
+            client._dispatch("b", "second")
+            client._dispatch("a", "third")
+
+            client.handlers["c"] = received.append  # Written directly, without register_handler
+            client._dispatch("c", "fourth")
+
+            assert received == ["first", "third", "fourth"]
+            assert "No handler for topic a." in caplog.text
+            assert "Error in handler for topic b: boom" in caplog.text
+
+
+class TestAsyncPubSubClient:
+    """Test AsyncPubSubClient dispatch."""
+
+    @pytest.fixture
+    def client(self):
+        """Create an AsyncPubSubClient with a mocked Socket.IO client."""
+        with patch("socketio.AsyncClient", Mock(spec=socketio.AsyncClient)):
+            client = AsyncPubSubClient(
+                url="http://localhost:5000", consumer="test_consumer", topics=["sports", "news"]
+            )
+            client.sio.emit = AsyncMock()
+            yield client
+            client._executor.shutdown(wait=True)
+
+    def test_coroutine_and_sync_handlers(self, client):
+        """Test that coroutine handlers are awaited and sync handlers run in the pool."""
+        received = []
+
+        async def async_handler(message):
+            received.append(("async", message))
+
+        def sync_handler(message):
+            received.append(("sync", message))
+
+        client.register_handler("sports", async_handler)
+        client.handlers["news"] = sync_handler  # Direct writes to the dict are honoured too
+
+        async def scenario():
+            await client.on_message({"topic": "sports", "message_id": "m1", "message": "Goal"})
+            await client.on_message({"topic": "news", "message_id": "m2", "message": "Flash"})
+
+        asyncio.run(scenario())
+
+        assert received == [("async", "Goal"), ("sync", "Flash")]
+        assert client.sio.emit.await_count == 2
+        client.sio.emit.assert_awaited_with(
+            "consumed",
+            {"consumer": "test_consumer", "topic": "news", "message_id": "m2",
+             "message": "Flash"},
         )
 
+
+class TestDatabaseOperations:
+    """Test database operations in isolation."""
+
+    def test_database_schema(self, schema_db, cursor):
+        """Test that the database schema is correct."""
+        conn = schema_db
+
         # Test schema by inserting data
         cursor.execute("INSERT INTO messages (topic, message) VALUES ('test', 'msg')")
         cursor.execute("INSERT INTO subscriptions (consumer, topic) VALUES ('alice', 'test')")
@@ -322,37 +569,11 @@ class TestDatabaseOperations:
         cursor.execute("SELECT COUNT(*) FROM consumptions")
         assert cursor.fetchone()[0] == 1
 
-        conn.close()
-
-    def test_foreign_key_constraint(self):
+    def test_foreign_key_constraint(self, schema_db, cursor):
         """Test foreign key constraints work."""
-        conn = sqlite3.connect(":memory:")
+        conn = schema_db
+        # Enforcement is OFF by default in SQLite and stays off for every other test
         conn.execute("PRAGMA foreign_keys = ON")
-        cursor = conn.cursor()
-
-        # Create tables with foreign key
-        cursor.execute(
-            """
-            CREATE TABLE messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                topic TEXT NOT NULL,
-                message TEXT NOT NULL,
-                timestamp REAL DEFAULT (CURRENT_TIMESTAMP)
-            )
-        """
-        )
-
-        cursor.execute(
-            """
-            CREATE TABLE consumptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                consumer TEXT NOT NULL,
-                message_id INTEGER NOT NULL,
-                consumed_at REAL DEFAULT (CURRENT_TIMESTAMP),
-                FOREIGN KEY (message_id) REFERENCES messages (id)
-            )
-        """
-        )
 
         # Insert valid message
         cursor.execute("INSERT INTO messages (topic, message) VALUES ('test', 'msg')")
@@ -365,9 +586,12 @@ class TestDatabaseOperations:
         )
         conn.commit()
 
-        # Invalid foreign key reference should fail
+        # Invalid foreign key reference should fail; only the savepoint is rolled back
+        cursor.execute("SAVEPOINT fk_check")
         with pytest.raises(sqlite3.IntegrityError):
             cursor.execute("INSERT INTO consumptions (consumer, message_id) VALUES ('bob', 999)")
-            conn.commit()
+        cursor.execute("ROLLBACK TO fk_check")
+        cursor.execute("RELEASE fk_check")
 
-        conn.close()
+        cursor.execute("SELECT consumer FROM consumptions")
+        assert cursor.fetchall() == [("alice",)]
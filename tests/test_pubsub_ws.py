@@ -1,137 +1,181 @@
+import gzip
+import json
 import sqlite3
 import sys
+import threading
+import time
 from pathlib import Path
+from types import SimpleNamespace
 
 # Add src to path - needs to be before local imports
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
-from unittest.mock import patch  # noqa: E402
+from unittest.mock import ANY, call, patch  # noqa: E402
 
 import pytest  # noqa: E402
-from flask import request  # noqa: E402
 
+from pubsub.pubsub_json import OrjsonModule  # noqa: E402
 from pubsub_ws import (  # noqa: E402
     Broker,
+    OrjsonProvider,
     app,
+    handle_consumed,
     handle_disconnect,
     handle_subscribe,
     init_db,
     socketio,
+    stream_json_array,
 )
 
+# Request bodies shared by the tests below; the handlers only read them
+_PUBLISH_PAYLOAD = {
+    "topic": "test_topic",
+    "message_id": "test_msg_id",
+    "message": {"data": "hello"},
+    "producer": "test_producer",
+}
+_CONSUMED_DATA = {
+    "consumer": "test_consumer_c",
+    "topic": "test_topic_c",
+    "message_id": "msg_id_c",
+    "message": {"content": "consumed_message"},
+}
+_SUBSCRIBE_DATA = {"consumer": "test_consumer", "topics": ["topic_a", "topic_b"]}
+
+
+# Fixtures (db_conn, test_broker and the test clients live in conftest.py)
+@pytest.fixture(autouse=True)
+def _empty_db(db_conn):
+    """Hands each test the shared database with its tables emptied."""
+    db_conn.rollback()
+    db_conn.executescript(
+        """
+        DELETE FROM consumptions;
+        DELETE FROM subscriptions;
+        DELETE FROM messages;
+    """
+    )
 
-# Fixtures (unchanged)
-@pytest.fixture
-def db_conn():
-    """Creates and initializes an in-memory SQLite database for each test."""
-    conn = sqlite3.connect(":memory:")
-    init_db(db_name=":memory:", connection=conn)
-    yield conn
-    conn.close()
 
+@pytest.fixture(autouse=True)
+def _swap_broker(test_broker, monkeypatch):
+    """Points the module-level broker of pubsub_ws at this test's broker, and stubs init_db."""
+    monkeypatch.setattr("pubsub_ws.broker", test_broker)
+    monkeypatch.setattr("pubsub_ws.init_db", lambda *args, **kwargs: None)
 
-@pytest.fixture
-def test_broker(db_conn):
-    """Creates a Broker instance using the in-memory database."""
-    broker = Broker(db_name=":memory:", test_conn=db_conn)
-    yield broker
+
+class EmitRecorder:
+    """Records the calls made to it; a much cheaper stand-in for socketio.emit than a MagicMock."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+
+    def assert_any_call(self, *args, **kwargs):
+        assert (args, kwargs) in self.calls, self.calls
 
 
 @pytest.fixture
-def socketio_test_client(test_broker, db_conn):
-    """Creates a Socket.IO test client for the Flask application."""
-    # Note: This client is mainly useful for complete integration tests,
-    # not for directly testing handlers that manipulate `request.sid`.
-    # We keep it for its ability to send events and receive responses.
-    with patch("pubsub_ws.broker", new=test_broker), patch("pubsub_ws.init_db"):
-        client = socketio.test_client(app)
-        yield client
-        client.disconnect()
+def emit_calls(monkeypatch):
+    """Replaces socketio.emit with an EmitRecorder for the duration of the test."""
+    recorder = EmitRecorder()
+    monkeypatch.setattr("pubsub_ws.socketio.emit", recorder)
+    return recorder
 
 
 @pytest.fixture
-def flask_test_client(test_broker, db_conn):
-    """Creates a Flask test client for the application."""
-    with patch("pubsub_ws.broker", new=test_broker), app.test_client() as client:
-        yield client
+def socket_request(monkeypatch):
+    """Stands in for the Flask-SocketIO request proxy; tests set its `sid` before a handler call."""
+    req = SimpleNamespace(sid=None)
+    monkeypatch.setattr("pubsub_ws.request", req)
+    return req
 
 
 # --- Tests for the Broker class (unchanged because they pass) ---
 
 
-def test_broker_register_subscription(test_broker, mocker):
+def test_broker_register_subscription(test_broker, emit_calls):
     sid = "test_sid_1"
     consumer = "test_consumer_1"
     topic = "test_topic_1"
-    with patch.object(socketio, "emit") as mock_emit:
-        test_broker.register_subscription(sid, consumer, topic)
-        clients = test_broker.get_clients()
-        assert len(clients) == 1
-        assert clients[0]["consumer"] == consumer
-        assert clients[0]["topic"] == topic
-        mock_emit.assert_called_with(
-            "new_client", {"consumer": consumer, "topic": topic, "connected_at": mocker.ANY}
-        )
+    test_broker.register_subscription(sid, consumer, topic)
+    clients = test_broker.get_clients()
+    assert len(clients) == 1
+    assert clients[0]["consumer"] == consumer
+    assert clients[0]["topic"] == topic
+    assert emit_calls.calls == [
+        (("new_client", {"consumer": consumer, "topic": topic, "connected_at": ANY}), {})
+    ]
+
+
+def test_broker_register_subscriptions_emits_once(test_broker, emit_calls):
+    test_broker.register_subscriptions("sid_1", "alice", ["sport", "news"], connected_at=5.0)
+
+    assert emit_calls.calls == [(("new_client_batch", [
+        {"consumer": "alice", "topic": "sport", "connected_at": 5.0},
+        {"consumer": "alice", "topic": "news", "connected_at": 5.0},
+    ]), {})]
+    assert test_broker._topic_sids == {"sport": {"sid_1"}, "news": {"sid_1"}}
 
 
-def test_broker_unregister_client(test_broker):
+def test_broker_unregister_client(test_broker, emit_calls):
     sid = "test_sid_2"
     consumer = "test_consumer_2"
     topic = "test_topic_2"
     test_broker.register_subscription(sid, consumer, topic)
-    with patch.object(socketio, "emit") as mock_emit:
-        test_broker.unregister_client(sid)
-        clients = test_broker.get_clients()
-        assert len(clients) == 0
-        mock_emit.assert_called_with("client_disconnected", {"consumer": consumer, "topic": topic})
+    test_broker.unregister_client(sid)
+    clients = test_broker.get_clients()
+    assert len(clients) == 0
+    assert emit_calls.calls[-1] == \
+        (("client_disconnected", {"consumer": consumer, "topic": topic}), {})
 
 
-def test_broker_save_message(test_broker, mocker):
+def test_broker_save_message(test_broker, emit_calls):
     topic = "sport"
     message_id = "msg_123"
     message = {"text": "Football score"}
     producer = "news_bot"
-    with patch.object(socketio, "emit") as mock_emit:
-        test_broker.save_message(topic, message_id, message, producer)
-        messages = test_broker.get_messages()
-        assert len(messages) == 1
-        assert messages[0]["message_id"] == message_id
-        assert messages[0]["message"] == message
-        assert messages[0]["producer"] == producer
-        mock_emit.assert_called_with(
-            "new_message",
-            {
-                "topic": topic,
-                "message_id": message_id,
-                "message": message,
-                "producer": producer,
-                "timestamp": mocker.ANY,
-            },
-        )
+    test_broker.save_message(topic, message_id, message, producer)
+    messages = test_broker.get_messages()
+    assert len(messages) == 1
+    assert messages[0]["message_id"] == message_id
+    assert messages[0]["message"] == message
+    assert messages[0]["producer"] == producer
+    emit_calls.assert_any_call(
+        "new_message",
+        {
+            "topic": topic,
+            "message_id": message_id,
+            "message": message,
+            "producer": producer,
+            "timestamp": ANY,
+        },
+    )
 
 
-def test_broker_save_consumption(test_broker, mocker):
+def test_broker_save_consumption(test_broker, emit_calls):
     consumer = "alice"
     topic = "finance"
     message_id = "msg_456"
     message = {"stock": "AAPL", "price": 170}
-    with patch.object(socketio, "emit") as mock_emit:
-        test_broker.save_consumption(consumer, topic, message_id, message)
-        consumptions = test_broker.get_consumptions()
-        assert len(consumptions) == 1
-        assert consumptions[0]["consumer"] == consumer
-        assert consumptions[0]["message_id"] == message_id
-        assert consumptions[0]["message"] == message
-        mock_emit.assert_called_with(
-            "new_consumption",
-            {
-                "consumer": consumer,
-                "topic": topic,
-                "message_id": message_id,
-                "message": message,
-                "timestamp": mocker.ANY,
-            },
-        )
+    test_broker.save_consumption(consumer, topic, message_id, message)
+    consumptions = test_broker.get_consumptions()
+    assert len(consumptions) == 1
+    assert consumptions[0]["consumer"] == consumer
+    assert consumptions[0]["message_id"] == message_id
+    assert consumptions[0]["message"] == message
+    emit_calls.assert_any_call(
+        "new_consumption",
+        {
+            "consumer": consumer,
+            "topic": topic,
+            "message_id": message_id,
+            "message": message,
+            "timestamp": ANY,
+        },
+    )
 
 
 def test_broker_get_clients_and_messages_empty(test_broker):
@@ -140,30 +184,258 @@ def test_broker_get_clients_and_messages_empty(test_broker):
     assert test_broker.get_consumptions() == []
 
 
+def test_broker_queues_writes_until_flush(test_broker, db_conn):
+    with patch.object(socketio, "emit"):
+        test_broker.save_message("sport", "msg_1", {"score": "1-0"}, "bot")
+        test_broker.save_consumption("alice", "sport", "msg_1", {"score": "1-0"})
+
+    # Nothing written yet: rows are waiting for the writer
+    assert db_conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 0
+
+    test_broker.flush()
+    assert db_conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 1
+    assert db_conn.execute("SELECT COUNT(*) FROM consumptions").fetchone()[0] == 1
+
+
+def test_broker_flush_keeps_good_rows_when_one_is_rejected(test_broker, db_conn, emit_calls,
+                                                           caplog):
+    assert test_broker.get_messages() == []  # Loads the recent-rows cache
+    test_broker.save_message("sport", "msg_1", "a", "bot")
+    test_broker.save_message("sport", {"not": "a string"}, "b", "bot")  # Cannot be bound
+    test_broker.save_message("sport", "msg_3", "c", "bot")
+    test_broker.save_consumption("alice", "sport", "msg_1", "a")
+    test_broker.flush()
+
+    assert {r[0] for r in db_conn.execute("SELECT message_id FROM messages")} == \
+        {"msg_1", "msg_3"}
+    assert db_conn.execute("SELECT COUNT(*) FROM consumptions").fetchone()[0] == 1
+    assert "Rejected message {'not': 'a string'}" in caplog.text
+    # The rejected row is not listed from the cache either
+    assert [m["message_id"] for m in test_broker.get_messages()] == ["msg_3", "msg_1"]
+
+
+def test_broker_requeues_rows_after_transient_error(test_broker, db_conn, emit_calls):
+    test_broker.save_message("sport", "msg_1", "a", "bot")
+    test_broker.save_consumption("alice", "sport", "msg_1", "a")
+    with patch("pubsub_ws._begin_write",
+               side_effect=sqlite3.OperationalError("database is locked")):
+        test_broker.flush()
+    assert db_conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 0
+
+    test_broker.save_message("sport", "msg_2", "b", "bot")
+    test_broker.flush()  # The requeued rows go first, ahead of the newer one
+    assert [r[0] for r in db_conn.execute("SELECT message_id FROM messages ORDER BY rowid")] == \
+        ["msg_1", "msg_2"]
+    assert db_conn.execute("SELECT COUNT(*) FROM consumptions").fetchone()[0] == 1
+
+
+def test_broker_flushes_when_batch_is_full(db_conn):
+    broker = Broker(db_name=":memory:", test_conn=db_conn, flush_batch_size=2)
+    with patch.object(socketio, "emit"):
+        broker.save_message("sport", "msg_1", "a", "bot")
+        assert db_conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 0
+        broker.save_message("sport", "msg_2", "b", "bot")
+
+    assert db_conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 2
+
+
+def test_broker_synchronous_writes_commit_each_save(db_conn):
+    broker = Broker(db_name=":memory:", test_conn=db_conn, synchronous_writes=True)
+    with patch.object(socketio, "emit"):
+        broker.save_message("sport", "msg_1", "a", "bot")
+        assert db_conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 1
+        broker.save_consumption("alice", "sport", "msg_1", "a")
+        assert db_conn.execute("SELECT COUNT(*) FROM consumptions").fetchone()[0] == 1
+
+
+def test_broker_coalesces_events_when_batching(test_broker, emit_calls):
+    with patch.object(socketio, "start_background_task") as mock_task:
+        test_broker.start_event_batching()
+    mock_task.assert_called_once_with(test_broker._event_loop)
+
+    test_broker.register_subscription("sid_1", "alice", "sport")
+    test_broker.save_message("sport", "msg_1", "a", "bot")
+    test_broker.save_message("sport", "msg_2", "b", "bot")
+    assert emit_calls.calls == []
+
+    test_broker.flush_events()
+
+    assert len(emit_calls.calls) == 2
+    emit_calls.assert_any_call(
+        "new_client_batch", [{"consumer": "alice", "topic": "sport", "connected_at": ANY}])
+    events = dict(args for args, _ in emit_calls.calls)
+    assert [e["message_id"] for e in events["new_message_batch"]] == ["msg_1", "msg_2"]
+
+
+def test_broker_serves_recent_rows_from_memory(db_conn):
+    broker = Broker(db_name=":memory:", test_conn=db_conn, recent_cache_size=2)
+    with patch("pubsub_ws.time.time", side_effect=[1.0, 2.0, 3.0]), \
+            patch.object(socketio, "emit"):
+        broker.save_message("sport", "msg_1", "a", "bot")
+        assert [m["message_id"] for m in broker.get_messages()] == ["msg_1"]  # Loads the cache
+        broker.save_message("sport", "msg_2", "b", "bot")
+        broker.save_message("sport", "msg_3", "c", "bot")
+
+    with patch.object(broker, "_select_page") as mock_select:
+        assert [m["message_id"] for m in broker.get_messages(limit=2)] == ["msg_3", "msg_2"]
+        assert [m["message_id"] for m in broker.get_messages(before=3.0, limit=1)] == ["msg_2"]
+        mock_select.assert_not_called()
+
+    # Older rows than the cache holds come from SQLite
+    assert [m["message_id"] for m in broker.get_messages()] == ["msg_3", "msg_2", "msg_1"]
+    assert [m["message_id"] for m in broker.get_messages(before=3.0, limit=2)] == \
+        ["msg_2", "msg_1"]
+
+
+def test_broker_compresses_large_bodies(test_broker, db_conn):
+    large = {"text": "x" * 4096}
+    with patch.object(socketio, "emit"):
+        test_broker.save_message("sport", "small", "hello", "bot")
+        test_broker.save_message("sport", "large", large, "bot")
+    test_broker.flush()
+
+    stored = dict(db_conn.execute("SELECT message_id, message FROM messages").fetchall())
+    assert stored["small"] == '"hello"'
+    assert isinstance(stored["large"], bytes) and len(stored["large"]) < 4096
+
+    messages = {m["message_id"]: m["message"] for m in test_broker.get_messages()}
+    assert messages == {"small": "hello", "large": large}
+
+
+def test_broker_encoded_rows_match_decoded_rows(test_broker):
+    with patch.object(socketio, "emit"):
+        test_broker.save_message("sport", "small", {"score": "1-0"}, "bot")
+        test_broker.save_message("sport", "large", {"text": "x" * 4096}, None)
+        test_broker.save_consumption("alice", "sport", "small", "Goal")
+
+    assert [json.loads(m) for m in test_broker.iter_messages_json()] == \
+        test_broker.get_messages()
+    assert [json.loads(c) for c in test_broker.iter_consumptions_json()] == \
+        test_broker.get_consumptions()
+
+
+def test_broker_subscriptions_stay_in_memory(test_broker, db_conn):
+    with patch.object(socketio, "emit"):
+        test_broker.register_subscription("sid_1", "alice", "sport")
+        test_broker.register_subscription("sid_1", "alice", "news")
+        test_broker.register_subscription("sid_2", "bob", "sport")
+
+        assert test_broker._topic_sids == {"sport": {"sid_1", "sid_2"}, "news": {"sid_1"}}
+        test_broker.unregister_client("sid_1")
+
+    assert test_broker._topic_sids == {"sport": {"sid_2"}}
+    assert test_broker.get_clients() == [
+        {"consumer": "bob", "topic": "sport", "connected_at": ANY}
+    ]
+    test_broker.flush()
+    assert db_conn.execute("SELECT COUNT(*) FROM subscriptions").fetchone()[0] == 0
+
+
+def test_recent_rows_queries_use_partial_indexes(db_conn):
+    for sql, index in [(Broker._SQL_SELECT_MESSAGES, "idx_messages_recent"),
+                       (Broker._SQL_SELECT_CONSUMPTIONS, "idx_consumptions_recent")]:
+        plan = " ".join(
+            row[-1] for row in db_conn.execute("EXPLAIN QUERY PLAN " + sql, (0.0, 10)))
+        assert index in plan
+        assert "TEMP B-TREE" not in plan
+
+
+def test_broker_reuses_wal_connection(tmp_path):
+    db_name = str(tmp_path / "pubsub.db")
+    init_db(db_name)
+    broker = Broker(db_name=db_name)
+    conn = broker._get_db_connection()
+    try:
+        assert broker._get_db_connection() is conn
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+        assert broker._get_read_connection().execute("PRAGMA cache_size").fetchone()[0] == -20000
+        with patch.object(socketio, "emit"):
+            broker.save_message("sport", "msg_1", "hello", "bot")
+        assert [m["message_id"] for m in broker.get_messages()] == ["msg_1"]
+    finally:
+        broker.close()
+
+
+def test_broker_reads_through_per_thread_connection(tmp_path):
+    db_name = str(tmp_path / "pubsub.db")
+    init_db(db_name)
+    broker = Broker(db_name=db_name)
+    try:
+        reader = broker._get_read_connection()
+        assert reader is not broker._get_db_connection()
+        assert broker._get_read_connection() is reader
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(broker._get_read_connection()))
+        thread.start()
+        thread.join()
+        assert other[0] is not reader
+
+        with patch.object(socketio, "emit"):
+            broker.save_consumption("alice", "sport", "msg_1", "hello")
+        assert [c["message_id"] for c in broker.get_consumptions()] == ["msg_1"]
+        with pytest.raises(sqlite3.OperationalError):
+            reader.execute("DELETE FROM consumptions")
+    finally:
+        broker.close()
+
+
+def test_broker_read_leaves_the_flush_to_the_writer_thread(tmp_path):
+    db_name = str(tmp_path / "pubsub.db")
+    init_db(db_name)
+    broker = Broker(db_name=db_name, flush_interval=60)  # Only a wake-up makes it flush
+    broker.start_writer()
+    real_flush = broker.flush
+    flush_threads = []
+
+    def flush():
+        flush_threads.append(threading.current_thread().name)
+        real_flush()
+
+    try:
+        with patch.object(broker, "flush", side_effect=flush), patch.object(socketio, "emit"):
+            broker.save_message("sport", "msg_1", "hello", "bot")
+            assert [m["message_id"] for m in broker.get_messages()] == ["msg_1"]
+        assert set(flush_threads) == {"broker-writer"}
+    finally:
+        broker.close()
+
+
+def test_broker_writer_thread_flushes_in_background(tmp_path):
+    db_name = str(tmp_path / "pubsub.db")
+    init_db(db_name)
+    broker = Broker(db_name=db_name, flush_interval=0.01)
+    broker.start_writer()
+    try:
+        with patch.object(socketio, "emit"):
+            broker.save_message("sport", "msg_1", "hello", "bot")
+        reader = broker._get_read_connection()
+        for _ in range(100):
+            if reader.execute("SELECT COUNT(*) FROM messages").fetchone()[0]:
+                break
+            time.sleep(0.01)
+        assert reader.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 1
+    finally:
+        broker.close()
+    assert broker._writer_thread is None
+
+
 # --- Tests for HTTP endpoints (Flask) (unchanged because they pass) ---
 
 
-def test_publish_endpoint(flask_test_client, test_broker):
-    topic = "test_topic"
-    message_id = "test_msg_id"
-    message_content = {"data": "hello"}
-    producer = "test_producer"
-    payload = {
-        "topic": topic,
-        "message_id": message_id,
-        "message": message_content,
-        "producer": producer,
-    }
-    with patch.object(test_broker, "save_message") as mock_save, patch(
-            "pubsub_ws.socketio.emit"
-    ) as mock_emit:
+def test_publish_endpoint(flask_test_client, test_broker, emit_calls):
+    payload = _PUBLISH_PAYLOAD
+    topic = payload["topic"]
+    test_broker.register_subscription("sid_1", "alice", topic)
+    emit_calls.calls.clear()
+    with patch.object(test_broker, "save_message") as mock_save:
         response = flask_test_client.post("/publish", json=payload)
         assert response.status_code == 200
         assert response.json == {"status": "ok"}
-        mock_save.assert_called_once_with(
-            topic=topic, message_id=message_id, message=message_content, producer=producer
-        )
-        mock_emit.assert_called_once_with("message", payload, to=topic)
+        mock_save.assert_called_once_with(**payload)
+    assert emit_calls.calls == [(("message", payload), {"to": topic})]
 
 
 def test_publish_endpoint_missing_data(flask_test_client):
@@ -174,12 +446,63 @@ def test_publish_endpoint_missing_data(flask_test_client):
     assert "Missing topic, message_id, message, or producer" in response.json["message"]
 
 
-def test_clients_endpoint(flask_test_client, test_broker):
-    test_broker.register_subscription("s1", "bob", "tech")
+def test_json_responses_use_orjson_provider(flask_test_client):
+    assert isinstance(app.json, OrjsonProvider)
     response = flask_test_client.get("/clients")
+    assert response.mimetype == "application/json"
+    assert response.json == []
+
+
+def test_publish_endpoints_reject_non_string_fields(flask_test_client, test_broker):
+    for field, value in [("message_id", {"x": 1}), ("message_id", 5), ("message_id", [1]),
+                         ("topic", ["sport"]), ("topic", {"a": 1}), ("producer", 7)]:
+        payload = dict(_PUBLISH_PAYLOAD, **{field: value})
+        assert flask_test_client.post("/publish", json=payload).status_code == 400
+        assert flask_test_client.post("/publish_batch", json=[_PUBLISH_PAYLOAD, payload]) \
+            .status_code == 400
+
+    assert test_broker.get_messages() == []
+
+
+def test_publish_endpoint_rejects_non_object_body(flask_test_client, test_broker):
+    with patch.object(test_broker, "save_message") as mock_save:
+        assert flask_test_client.post("/publish", json=["not", "an", "object"]).status_code == 400
+        assert flask_test_client.post("/publish", data="not json").status_code == 400
+        mock_save.assert_not_called()
+
+
+def test_publish_batch_endpoint(flask_test_client, test_broker, emit_calls):
+    payloads = [
+        {"topic": "sport", "message_id": "b1", "message": {"n": 1}, "producer": "bot"},
+        {"topic": "news", "message_id": "b2", "message": {"n": 2}, "producer": "bot"},
+    ]
+    with patch.object(test_broker, "save_message") as mock_save:
+        test_broker.register_subscription("sid_1", "alice", "sport")
+        test_broker.register_subscription("sid_1", "alice", "news")
+        response = flask_test_client.post("/publish_batch", json=payloads)
+        assert response.status_code == 200
+        assert response.json == {"status": "ok", "count": 2}
+        assert mock_save.call_count == 2
+    emit_calls.assert_any_call("message", payloads[0], to="sport")
+    emit_calls.assert_any_call("message", payloads[1], to="news")
+
+
+def test_publish_batch_endpoint_rejects_incomplete_message(flask_test_client, test_broker):
+    payloads = [
+        {"topic": "sport", "message_id": "b1", "message": "ok", "producer": "bot"},
+        {"topic": "sport", "message": "missing_id", "producer": "bot"},
+    ]
+    with patch.object(test_broker, "save_message") as mock_save:
+        response = flask_test_client.post("/publish_batch", json=payloads)
+        assert response.status_code == 400
+        mock_save.assert_not_called()
+
+
+def test_clients_endpoint(flask_test_client, test_broker):
+    test_broker.register_subscription("s1", "bob", "tech", connected_at=5.0)
+    response = flask_test_client.get("/clients?rows=1")
     assert response.status_code == 200
-    assert len(response.json) == 1
-    assert response.json[0]["consumer"] == "bob"
+    assert response.json == [["bob", "tech", 5.0]]
 
 
 def test_messages_endpoint(flask_test_client, test_broker):
@@ -189,113 +512,211 @@ def test_messages_endpoint(flask_test_client, test_broker):
     assert len(response.json) == 1
     assert response.json[0]["topic"] == "news"
 
+    # Same row as an array of its values, in key order
+    [row] = flask_test_client.get("/messages?rows=1").json
+    assert row == list(response.json[0].values())
+
+
+def test_stream_json_array_chunks():
+    items = [{"n": n} for n in range(5)]
+    chunks = list(stream_json_array([json.dumps(i).encode() for i in items], chunk_size=2))
+    assert len(chunks) == 5  # "[", three chunks of at most two items, "]"
+    assert json.loads(b"".join(chunks)) == items
+    assert b"".join(stream_json_array([])) == b"[]"
+
+
+def test_messages_endpoint_paginates(flask_test_client, test_broker):
+    with patch("pubsub_ws.time.time", side_effect=[1.0, 2.0, 3.0]), patch.object(socketio, "emit"):
+        for n in range(3):
+            test_broker.save_message("news", f"id_{n}", "text", "reporter")
+
+    response = flask_test_client.get("/messages?limit=2")
+    assert [m["message_id"] for m in response.json] == ["id_2", "id_1"]
+
+    response = flask_test_client.get("/messages?limit=2&before=2.0")
+    assert [m["message_id"] for m in response.json] == ["id_0"]
+
+    response = flask_test_client.get("/messages?limit=0")
+    assert len(response.json) == 1  # Clamped to at least one row
+
 
 def test_consumptions_endpoint(flask_test_client, test_broker):
     test_broker.save_consumption("charlie", "sport", "game_msg", {"score": "2-1"})
-    response = flask_test_client.get("/consumptions")
+    response = flask_test_client.get("/consumptions?rows=1")
     assert response.status_code == 200
-    assert len(response.json) == 1
-    assert response.json[0]["consumer"] == "charlie"
+    assert [row[:4] for row in response.json] == [
+        ["charlie", "sport", "game_msg", {"score": "2-1"}]
+    ]
 
 
 # --- Tests for Socket.IO events ---
 
 
-def test_socketio_subscribe(socketio_test_client, test_broker, mocker):
-    consumer_name = "test_consumer"
-    topics = ["topic_a", "topic_b"]
+def test_socketio_subscribe(test_broker, mocker, socket_request):
+    consumer_name = _SUBSCRIBE_DATA["consumer"]
+    topics = _SUBSCRIBE_DATA["topics"]
 
     # Generate an arbitrary but constant SID for this test
     test_sid = "test_socket_sid_123_sub"  # Utilisez un SID unique pour ce test
 
-    # Utilisez le contexte de l'application Flask pour simuler `request`
-    with app.test_request_context("/"):
-        # Force request.sid to our test SID
-        request.sid = test_sid  # <-- NEW: Direct assignment to request.sid
-
-        with patch("pubsub_ws.join_room") as mock_join_room, patch.object(
-                test_broker, "register_subscription"
-        ) as mock_register_subscription, patch("pubsub_ws.emit") as mock_emit:
-            # Call the event handler directly.
-            # `handle_subscribe` attend `data` comme argument.
-            handle_subscribe(
-                {"consumer": consumer_name, "topics": topics}
-            )  # <-- NOUVEAU : Appel direct
-
-            mock_join_room.assert_any_call("topic_a")
-            mock_join_room.assert_any_call("topic_b")
-            assert mock_join_room.call_count == 2
-
-            mock_register_subscription.assert_has_calls(
-                [
-                    mocker.call(test_sid, consumer_name, "topic_a"),
-                    mocker.call(test_sid, consumer_name, "topic_b"),
-                ],
-                any_order=True,
-            )
-            assert mock_register_subscription.call_count == 2
-
-            mock_emit.assert_any_call(
-                "message",
-                {
-                    "topic": "topic_a",
-                    "message_id": mocker.ANY,
-                    "message": "Subscribed to topic_a",
-                    "producer": "server",
-                },
-                to=test_sid,
-            )
-            mock_emit.assert_any_call(
-                "message",
+    socket_request.sid = test_sid
+
+    with patch("pubsub_ws.join_room") as mock_join_room, patch.object(
+            test_broker, "register_subscriptions"
+    ) as mock_register_subscriptions, patch("pubsub_ws.emit") as mock_emit:
+        # Call the event handler directly.
+        # `handle_subscribe` attend `data` comme argument.
+        handle_subscribe(_SUBSCRIBE_DATA)  # <-- NOUVEAU : Appel direct
+
+        assert mock_join_room.call_args_list == [call("topic_a"), call("topic_b")]
+
+        mock_register_subscriptions.assert_called_once_with(
+            test_sid, consumer_name, topics, connected_at=ANY
+        )
+
+        # Every confirmation goes out in a single packet
+        mock_emit.assert_called_once_with(
+            "message_batch",
+            [
                 {
-                    "topic": "topic_b",
+                    "topic": topic,
                     "message_id": mocker.ANY,
-                    "message": "Subscribed to topic_b",
+                    "message": f"Subscribed to {topic}",
                     "producer": "server",
-                },
-                to=test_sid,
-            )
-            assert mock_emit.call_count == 2
-
-            # Note: `socketio_test_client.get_received()` ne fonctionnera pas ici
-            # because we didn't emit *via* the test client, but directly
-            # au gestionnaire. Ce n'est pas une limitation du test mais un changement de focus.
-            # Si vous voulez tester ce que le client *recevrait*, vous devriez
-            # utiliser le socketio_test_client et les patches de `request.sid` pour sa session.
-            # Pour l'instant, nous testons le comportement du serveur.
-            # assert len(received) >= 2 # REMOVED
-
-
-def test_socketio_consumed(socketio_test_client, test_broker):
-    data = {
-        "consumer": "test_consumer_c",
-        "topic": "test_topic_c",
-        "message_id": "msg_id_c",
-        "message": {"content": "consumed_message"},
-    }
+                }
+                for topic in topics
+            ],
+            to=test_sid,
+        )
+
+
+def test_subscriber_receives_each_message_once(socketio_test_client, flask_test_client):
+    socketio_test_client.emit("subscribe", {"consumer": "alice", "topics": ["sport", "news"]})
+    socketio_test_client.get_received()
+
+    payload = {"topic": "sport", "message_id": "w1", "message": "Goal", "producer": "bot"}
+    response = flask_test_client.post("/publish", json=payload)
+    assert response.status_code == 200
+
+    received = [p for p in socketio_test_client.get_received() if p["name"] == "message"]
+    assert [p["args"] for p in received] == [payload]
+
+
+def test_server_packets_are_encoded_with_orjson():
+    assert socketio.server.packet_class.json is OrjsonModule
+
+
+def test_broker_message_rooms(test_broker):
+    with patch.object(socketio, "emit"):
+        assert test_broker.message_rooms("sport") is None
+
+        test_broker.register_subscription("sid_1", "alice", "sport")
+        test_broker.register_subscription("sid_2", "bob", "sport")
+        assert test_broker.message_rooms("sport") == "sport"
+        assert test_broker.message_rooms("news") is None
+
+        test_broker.unregister_client("sid_1")
+        assert test_broker.message_rooms("sport") == "sport"
+
+        test_broker.unregister_client("sid_2")
+        assert test_broker.message_rooms("sport") is None
+
+
+def test_client_html_is_cached_and_conditional(flask_test_client, tmp_path):
+    (tmp_path / "client.html").write_text("<html>pubsub</html>")
+    with patch.object(app, "root_path", str(tmp_path)), patch.dict("pubsub_ws._assets", clear=True):
+        response = flask_test_client.get("/client.html")
+        assert response.status_code == 200
+        assert response.data == b"<html>pubsub</html>"
+        etag = response.headers["ETag"]
+
+        (tmp_path / "client.html").unlink()  # Later requests are served from memory
+        gzipped = flask_test_client.get("/client.html", headers={"Accept-Encoding": "gzip"})
+        assert gzipped.headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(gzipped.data) == b"<html>pubsub</html>"
+
+        response = flask_test_client.get("/client.html", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+
+def test_static_files_are_cached(flask_test_client, tmp_path):
+    (tmp_path / "static").mkdir()
+    (tmp_path / "static" / "app.js").write_text("console.log(1);")
+    with patch.object(app, "root_path", str(tmp_path)), patch.dict("pubsub_ws._assets", clear=True):
+        response = flask_test_client.get("/static/app.js")
+        assert response.status_code == 200
+        assert response.mimetype in ("application/javascript", "text/javascript")
+        assert response.data == b"console.log(1);"
+        assert response.headers["ETag"]
+
+        assert flask_test_client.get("/static/../static/app.js").status_code == 404
+        assert flask_test_client.get("/static/missing.js").status_code == 404
+
+
+def test_client_html_missing(flask_test_client, tmp_path):
+    with patch.object(app, "root_path", str(tmp_path)), patch.dict("pubsub_ws._assets", clear=True):
+        assert flask_test_client.get("/client.html").status_code == 404
+
+
+def test_publish_refused_while_writer_backlog_is_full(flask_test_client, test_broker):
+    test_broker.max_pending_messages = 1
+    payload = {"topic": "sport", "message_id": "m1", "message": "Goal", "producer": "bot"}
+    with patch.object(socketio, "emit"):
+        assert flask_test_client.post("/publish", json=payload).status_code == 200
+        response = flask_test_client.post("/publish", json=dict(payload, message_id="m2"))
+        assert response.status_code == 503
+        assert flask_test_client.post("/publish_batch", json=[payload]).status_code == 503
+
+        test_broker.flush()
+        assert flask_test_client.post("/publish", json=dict(payload, message_id="m3")) \
+            .status_code == 200
+
+
+def test_publish_accepts_falsy_messages(flask_test_client, test_broker):
+    for message_id, message in [("m1", ""), ("m2", 0), ("m3", False)]:
+        payload = {"topic": "sport", "message_id": message_id, "message": message,
+                   "producer": "bot"}
+        assert flask_test_client.post("/publish", json=payload).status_code == 200
+    payload = {"topic": "sport", "message_id": "m4", "message": None, "producer": "bot"}
+    assert flask_test_client.post("/publish", json=payload).status_code == 400
+
+    assert [m["message"] for m in test_broker.get_messages()] == [False, 0, ""]
+
+
+def test_publish_without_subscribers_skips_emit(flask_test_client, test_broker, emit_calls):
+    payload = {"topic": "sport", "message_id": "m1", "message": "Goal", "producer": "bot"}
+    assert flask_test_client.post("/publish", json=payload).status_code == 200
+
+    assert [args[0] for args, _ in emit_calls.calls] == ["new_message"]
+    assert [m["message_id"] for m in test_broker.get_messages()] == ["m1"]
+
+
+def test_socketio_consumed(test_broker):
+    data = _CONSUMED_DATA
     with patch.object(test_broker, "save_consumption") as mock_save_consumption:
-        socketio_test_client.emit("consumed", data)
+        handle_consumed(data)
         mock_save_consumption.assert_called_once_with(
-            data["consumer"], data["topic"], data["message_id"], str(data["message"])
+            data["consumer"], data["topic"], data["message_id"], data["message"]
         )
 
+    with patch.object(socketio, "emit"):
+        handle_consumed(data)
+    assert test_broker.get_consumptions()[0]["message"] == {"content": "consumed_message"}
+
 
 # noinspection PyUnusedLocal
-def test_socketio_disconnect(socketio_test_client, test_broker, mocker):
+def test_socketio_disconnect(test_broker, mocker, socket_request):
     # Generate an arbitrary but constant SID for this test
     test_sid = "test_socket_sid_disconnect_456"
 
     # Enregistrez d'abord une souscription pour que unregister_client ait un impact
     test_broker.register_subscription(test_sid, "dis_consumer", "dis_topic")
 
-    # Utilisez le contexte de l'application Flask pour simuler `request`
-    with app.test_request_context("/"):
-        # Force request.sid to our test SID
-        request.sid = test_sid  # <-- NEW: Direct assignment to request.sid
+    socket_request.sid = test_sid
 
-        with patch.object(test_broker, "unregister_client") as mock_unregister_client:
-            # Call the event handler directly.
-            # `handle_disconnect` ne prend pas d'arguments explicites.
-            handle_disconnect()  # <-- NOUVEAU : Appel direct
+    with patch.object(test_broker, "unregister_client") as mock_unregister_client:
+        # Call the event handler directly.
+        # `handle_disconnect` ne prend pas d'arguments explicites.
+        handle_disconnect()  # <-- NOUVEAU : Appel direct
 
-            mock_unregister_client.assert_called_once_with(test_sid)
+        mock_unregister_client.assert_called_once_with(test_sid)